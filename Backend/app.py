@@ -1,6 +1,16 @@
+import atexit
 import base64
+import csv
+import hashlib
+import io
+import itertools
+import json
 import os
+import queue
+import re
 import tempfile
+import threading
+import time
 
 # Use temporary directory or current working directory for app data
 # This avoids permission issues in containerized environments
@@ -38,21 +48,33 @@ except PermissionError as e:
     os.environ['ULTRALYTICS_CONFIG_DIR'] = os.getcwd()
     os.environ['KERAS_HOME'] = os.getcwd()
 
+_startup_started = time.perf_counter()
+
 import cv2
 import numpy as np
-from flask import Flask, request, jsonify
-from mtcnn.mtcnn import MTCNN
-from keras_facenet import FaceNet
-from sklearn.metrics.pairwise import cosine_similarity
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask_pymongo import PyMongo
-from ultralytics import YOLO
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from bson.objectid import ObjectId  # Import ObjectId for MongoDB
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense
-from sklearn.preprocessing import LabelEncoder
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from functools import wraps
+from embedding_codec import STORAGE_FORMATS, decode_embedding, encode_embedding
+from search_index import create_search_index
+from gallery_snapshot import read_snapshot, write_snapshot
+from db_indexes import ensure_indexes
+from cnn_embedding import compile_cnn_inference, create_cnn_embedding_model
+from model_registry import ModelRegistry
+from face_detectors import DETECTOR_BACKENDS, create_detector
+from image_decode import decode_image, downscale
+from face_tracker import FaceTracker
+from frame_cache import FrameResultCache, dhash
+from motion_gate import MotionGate, boxes_overlap
+from collections import namedtuple
 
 app = Flask(__name__)
 CORS(app)
@@ -62,9 +84,89 @@ DEFAULT_ROLE = "user"
 ALLOWED_ROLES = {"user", "admin"}
 DEFAULT_ADMIN_ROLLNUMBER = os.getenv("DEFAULT_ADMIN_ROLLNUMBER", "23BD1A056V").upper()
 
-# Initialize MTCNN detector and FaceNet model
-detector = MTCNN()
-embedder = FaceNet()
+# How new embeddings are written: "array" (list of doubles), "float32" or "float16"
+# packed BSON Binary. Readers accept every format.
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "array").strip().lower()
+if EMBEDDING_STORAGE not in STORAGE_FORMATS:
+    print(f"Warning: Unknown EMBEDDING_STORAGE '{EMBEDDING_STORAGE}' - using 'array'")
+    EMBEDDING_STORAGE = "array"
+
+# Pipelines served by this deployment: facenet (/login), cnn (/CNN-login),
+# multiface (/recognize, /user_recognize) and crowd (/crowd).
+# /register needs both facenet and cnn.
+ALL_PIPELINES = ("facenet", "cnn", "multiface", "crowd")
+ENABLED_PIPELINES = {
+    name.strip().lower()
+    for name in os.getenv("ENABLED_PIPELINES", ",".join(ALL_PIPELINES)).split(",")
+    if name.strip()
+}
+for unknown_pipeline in ENABLED_PIPELINES - set(ALL_PIPELINES):
+    print(f"Warning: Unknown pipeline '{unknown_pipeline}' in ENABLED_PIPELINES")
+# Load the models of every enabled pipeline at startup instead of on first use
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "false").strip().lower() in ("1", "true", "yes")
+# Run dummy inputs through the enabled models in the background at startup;
+# /readyz reports ready only once this and the gallery load have finished
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").strip().lower() in ("1", "true", "yes")
+
+# Startup timing report: (step, seconds)
+startup_timings = []
+# Readiness of this worker, reported by /readyz
+readiness = {"gallery": False, "warmup": False, "warmup_error": None}
+
+def record_startup_timing(step, seconds):
+    startup_timings.append((step, seconds))
+    print(f"[startup] {step}: {seconds:.2f}s")
+
+def pipeline_enabled(name):
+    return name in ENABLED_PIPELINES
+
+def requires_pipelines(*names):
+    # Routes of disabled pipelines answer 503 instead of loading their models
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            disabled = [name for name in names if not pipeline_enabled(name)]
+            if disabled:
+                return jsonify(
+                    {"error": f"Pipeline disabled on this server: {', '.join(disabled)}"}
+                ), 503
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class LazyModel:
+    # Builds a model on first use; safe to call from concurrent request threads
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._instance is not None
+
+    def get(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    started = time.perf_counter()
+                    self._instance = self._factory()
+                    record_startup_timing(f"load {self.name}", time.perf_counter() - started)
+                instance = self._instance
+        return instance
+
+def _load_facenet():
+    from keras_facenet import FaceNet
+    return FaceNet()
+
+# Face detector backends (see face_detectors.py) and FaceNet model
+face_detectors = {
+    name: LazyModel(f"{name} detector", lambda name=name: create_detector(name))
+    for name in DETECTOR_BACKENDS
+}
+embedder = LazyModel("FaceNet", _load_facenet)
 
 # Configure MongoDB
 # The URI includes the database name 'travis_db' directly in the path.
@@ -77,7 +179,16 @@ embedder = FaceNet()
 app.config["MONGO_URI"] = "mongodb://localhost:27017/Face_Recognition"
 
 mongo = PyMongo(app)  # initialize
-haar_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+# Create the indexes every hot query relies on (see db_indexes.py);
+# run `python index_report.py` to check plans and unused indexes
+if os.getenv("ENSURE_INDEXES", "true").strip().lower() in ("1", "true", "yes"):
+    _indexes_started = time.perf_counter()
+    try:
+        ensure_indexes(mongo.db)
+    except Exception as e:
+        print(f"Warning: Could not ensure MongoDB indexes: {e}")
+    record_startup_timing("ensure indexes", time.perf_counter() - _indexes_started)
 
 def normalize_role(role_value, rollnumber=None):
     # Handle case where role_value might be an object or unexpected type
@@ -100,29 +211,542 @@ def normalize_role(role_value, rollnumber=None):
         return "admin"
     return DEFAULT_ROLE
 
+# Matches the users normalize_role() treats as admins: a stored "admin" role
+# (fix_roles_migration.py backfills normalized roles) or the default admin
+# roll number without an explicit "user" role
+ADMIN_QUERY = {
+    "$or": [
+        {"role": "admin"},
+        {"RollNumber": DEFAULT_ADMIN_ROLLNUMBER, "role": {"$ne": "user"}},
+    ]
+}
+# Serializes last-admin checks with the write they guard within a worker
+admin_change_lock = threading.Lock()
+
 def count_admins():
-    users = mongo.db.data.find({}, {"role": 1, "RollNumber": 1})
-    return sum(
-        1
-        for user in users
-        if normalize_role(user.get("role"), user.get("RollNumber")) == "admin"
+    # Indexed count instead of normalizing every user's role in Python
+    return mongo.db.data.count_documents(ADMIN_QUERY)
+
+# Responses polled by the admin dashboard are cached in-process. Entries are
+# invalidated when a write bumps the generation of their scope ("users" or
+# "attendance"); the TTL bounds staleness from writes made by other workers.
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+
+class ResponseCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}  # key -> (generations, stored_at, body, etag)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def bump(self, *scopes):
+        with self._lock:
+            for scope in scopes:
+                self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def _current(self, scopes):
+        return tuple(self._generations.get(scope, 0) for scope in scopes)
+
+    def get(self, key, scopes):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            generations, stored_at, body, etag = entry
+            if generations != self._current(scopes) or time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            return body, etag
+
+    def put(self, key, body, generations):
+        # generations are read before the database query, so a write that
+        # lands during the query leaves the entry already stale
+        etag = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            self._entries[key] = (generations, time.monotonic(), body, etag)
+        return etag
+
+    def generations(self, scopes):
+        with self._lock:
+            return self._current(scopes)
+
+response_cache = ResponseCache(RESPONSE_CACHE_TTL)
+
+def cached_json_response(key, scopes, build):
+    # Serves build()'s (payload, status) from the cache with an ETag; polls
+    # sending a matching If-None-Match get a 304 without touching MongoDB
+    cached = response_cache.get(key, scopes) if RESPONSE_CACHE_TTL > 0 else None
+    if cached is None:
+        generations = response_cache.generations(scopes)
+        payload, status = build()
+        body = app.json.dumps(payload).encode("utf-8")
+        if status != 200 or RESPONSE_CACHE_TTL <= 0:
+            return app.response_class(body, status=status, mimetype="application/json")
+        etag = response_cache.put(key, body, generations)
+    else:
+        body, etag = cached
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+# Attendance storage layout:
+#   legacy - attendance1: one document per student with a "YYYY-MM-DD": true field per day
+#   daily  - attendance_days: one document per day, {"date": ..., "present": [user ids]}
+# Convert existing data with: python migrate_attendance.py
+ATTENDANCE_SCHEMA = os.getenv("ATTENDANCE_SCHEMA", "legacy").strip().lower()
+if ATTENDANCE_SCHEMA not in ("legacy", "daily"):
+    print(f"Warning: Unknown ATTENDANCE_SCHEMA '{ATTENDANCE_SCHEMA}' - using 'legacy'")
+    ATTENDANCE_SCHEMA = "legacy"
+
+def attendance_collection():
+    if ATTENDANCE_SCHEMA == "daily":
+        return mongo.db.attendance_days
+    # Collection name 'attendance1' is already correctly used here
+    return mongo.db.attendance1
+
+def attendance_operations(marks):
+    # Bulk operations marking (roll number, user id, day) triples present
+    if ATTENDANCE_SCHEMA == "daily":
+        ids_by_day = {}
+        for rollnumber, user_id, day in marks:
+            if user_id is None:
+                print(f"Warning: No user id for {rollnumber} - attendance not recorded")
+                continue
+            ids_by_day.setdefault(day, set()).add(user_id)
+        return [
+            UpdateOne(
+                {"date": day},
+                {"$addToSet": {"present": {"$each": sorted(ids)}}},
+                upsert=True,
+            )
+            for day, ids in ids_by_day.items()
+        ]
+    return [
+        UpdateOne(
+            {'username': rollnumber},
+            {'$set': {day: True}},  # Mark as present for that day
+            upsert=True,
+        )
+        for rollnumber, _, day in marks
+    ]
+
+def record_attendance(rollnumber, user_id, day):
+    operations = attendance_operations([(rollnumber, user_id, day)])
+    if operations:
+        attendance_collection().bulk_write(operations)
+        response_cache.bump("attendance")
+
+# Attendance marks from multi-face recognition are buffered and written in bulk
+# once ATTENDANCE_FLUSH_SIZE marks are pending or every ATTENDANCE_FLUSH_INTERVAL seconds
+ATTENDANCE_FLUSH_SIZE = max(1, int(os.getenv("ATTENDANCE_FLUSH_SIZE", "200")))
+ATTENDANCE_FLUSH_INTERVAL = float(os.getenv("ATTENDANCE_FLUSH_INTERVAL", "2"))
+
+class AttendanceBuffer:
+    # Write-behind buffer for attendance: dedupes (roll number, day) pairs in
+    # memory and flushes them with one unordered bulk_write, so a 50-face photo
+    # or a live feed re-marking the same students does not cost a round trip each
+    def __init__(self, flush_size, flush_interval):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending = {}  # (roll number, day) -> user id
+        self._written = set()  # pairs already stored for _written_day
+        self._written_day = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def mark(self, rollnumber, user_id, day):
+        key = (rollnumber, day)
+        with self._lock:
+            if key in self._pending or key in self._written:
+                return
+            self._pending[key] = user_id
+            pending_count = len(self._pending)
+        if pending_count >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            operations = attendance_operations(
+                [(rollnumber, user_id, day) for (rollnumber, day), user_id in batch.items()]
+            )
+            try:
+                if operations:
+                    attendance_collection().bulk_write(operations, ordered=False)
+                    response_cache.bump("attendance")
+            except Exception as e:
+                print(f"Warning: Could not flush {len(batch)} attendance marks: {e}")
+                with self._lock:
+                    # retried on the next flush
+                    self._pending = {**batch, **self._pending}
+                return 0
+            with self._lock:
+                latest_day = max(day for _, day in batch)
+                if latest_day != self._written_day:
+                    # Only the current day needs deduping
+                    self._written = {key for key in self._written if key[1] == latest_day}
+                    self._written_day = latest_day
+                self._written |= {key for key in batch if key[1] == latest_day}
+            return len(batch)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="attendance-flush", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+attendance_buffer = AttendanceBuffer(ATTENDANCE_FLUSH_SIZE, ATTENDANCE_FLUSH_INTERVAL)
+attendance_buffer.start()
+# Write out whatever is still pending when the worker shuts down
+atexit.register(attendance_buffer.flush)
+
+# CNN weights come from a versioned registry (see model_registry.py) and are
+# loaded once; a newly published version is picked up within
+# CNN_REGISTRY_CHECK_INTERVAL seconds and swapped in atomically
+CNN_MODEL_REGISTRY = os.getenv("CNN_MODEL_REGISTRY", os.path.join(app_data_path, "cnn_models"))
+CNN_REGISTRY_CHECK_INTERVAL = float(os.getenv("CNN_REGISTRY_CHECK_INTERVAL", "10"))
+cnn_registry = ModelRegistry(CNN_MODEL_REGISTRY)
+
+# model: Keras model, infer: compiled inference path, version: registry version
+LoadedCNN = namedtuple("LoadedCNN", ["model", "infer", "version"])
+
+def _publish_initial_cnn_weights():
+    # First start with an empty registry: import the legacy weights file, or
+    # publish freshly initialized weights so every worker embeds alike
+    for legacy_path in (os.path.join(app_data_path, 'cnn_model.weights.h5'), 'cnn_model.weights.h5'):
+        if os.path.exists(legacy_path):
+            print(f"Publishing existing CNN model weights from {legacy_path}")
+            cnn_registry.publish(legacy_path)
+            return
+    print("No existing CNN model weights found - publishing initialized weights")
+    fd, tmp_path = tempfile.mkstemp(suffix=".weights.h5")
+    os.close(fd)
+    try:
+        create_cnn_embedding_model().save_weights(tmp_path)
+        cnn_registry.publish(tmp_path)
+    finally:
+        os.remove(tmp_path)
+
+def _bootstrap_cnn_registry():
+    # Only one worker publishes; the others wait for its manifest
+    return cnn_registry.bootstrap(_publish_initial_cnn_weights)
+
+def _load_cnn_version(entry):
+    if not cnn_registry.verify(entry):
+        raise ValueError(f"Checksum mismatch for CNN weights version {entry['version']}")
+    model = create_cnn_embedding_model()
+    model.load_weights(entry["path"])
+    print(f"Loaded CNN model weights version {entry['version']}")
+    return LoadedCNN(model, compile_cnn_inference(model), entry["version"])
+
+class RegistryCNNModel:
+    # Loads the current registry version on first use and checks the manifest
+    # at most every CNN_REGISTRY_CHECK_INTERVAL seconds for a new one
+    def __init__(self):
+        self._current = None
+        self._manifest_mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._current is not None
+
+    def get(self):
+        current = self._current
+        if current is None or time.monotonic() >= self._next_check:
+            current = self.refresh()
+        return current
+
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if self._current is not None and not force and now < self._next_check:
+                return self._current
+            self._next_check = now + CNN_REGISTRY_CHECK_INTERVAL
+            manifest_mtime = cnn_registry.manifest_mtime()
+            if self._current is not None and not force and manifest_mtime == self._manifest_mtime:
+                return self._current
+
+            started = time.perf_counter()
+            entry = cnn_registry.current() or _bootstrap_cnn_registry()
+            if self._current is None or entry["version"] != self._current.version:
+                try:
+                    loaded = _load_cnn_version(entry)
+                except Exception as e:
+                    if self._current is None:
+                        raise
+                    print(f"Warning: Keeping CNN weights version {self._current.version}: {e}")
+                    return self._current
+                self._current = loaded
+                record_startup_timing(
+                    f"load CNN {entry['version']}", time.perf_counter() - started
+                )
+            self._manifest_mtime = cnn_registry.manifest_mtime()
+            return self._current
+
+cnn_model = RegistryCNNModel()
+
+# FaceNet embeddings are 512-dimensional
+EMBEDDING_DIM = 512
+# Similarity above which a detected face is matched to a registered user
+RECOGNITION_THRESHOLD = 0.7
+
+def normalize_embeddings(embeddings, copy=True):
+    # Stack embeddings into a contiguous float32 matrix with unit-length rows
+    matrix = np.array(embeddings, dtype=np.float32, ndmin=2, copy=copy)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return np.ascontiguousarray(matrix)
+
+# Largest number of face crops sent to FaceNet in a single inference call
+FACENET_BATCH_SIZE = max(1, int(os.getenv("FACENET_BATCH_SIZE", "32")))
+# Batch face crops from concurrent requests (threaded servers) into shared
+# FaceNet/CNN calls, waiting at most INFERENCE_MAX_WAIT_MS for a batch to fill
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "true").strip().lower() in ("1", "true", "yes")
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "5"))
+
+class InferenceBatcher:
+    # Queues inputs from concurrent requests and runs them through a model in
+    # dynamically sized batches; every caller gets back only its own outputs
+    def __init__(self, name, run_batch, max_batch_size, max_wait_ms):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, inputs):
+        # Blocks until every input has been run; returns outputs in input order
+        self._ensure_worker()
+        futures = []
+        for item in inputs:
+            future = Future()
+            self._queue.put((item, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._worker, name=f"{self.name}-batcher", daemon=True
+                    )
+                    self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            try:
+                outputs = self.run_batch(np.stack([item for item, _ in batch]))
+                for (_, future), output in zip(batch, outputs):
+                    future.set_result(output)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+facenet_batcher = InferenceBatcher(
+    "facenet",
+    lambda batch: embedder.get().embeddings(batch),
+    FACENET_BATCH_SIZE,
+    INFERENCE_MAX_WAIT_MS,
+)
+cnn_batcher = InferenceBatcher(
+    "cnn",
+    lambda batch: cnn_model.get().infer(batch),
+    FACENET_BATCH_SIZE,
+    INFERENCE_MAX_WAIT_MS,
+)
+
+def embed_faces(rgb_faces, batch_size=FACENET_BATCH_SIZE):
+    # Embed (N,160,160,3) RGB crops with as few FaceNet calls as possible
+    if len(rgb_faces) == 0:
+        return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    faces = np.asarray(rgb_faces)
+    if INFERENCE_BATCHING:
+        return np.asarray(facenet_batcher.submit(faces))
+    return np.concatenate(
+        [
+            embedder.get().embeddings(faces[start:start + batch_size])
+            for start in range(0, len(faces), batch_size)
+        ]
     )
 
-def create_cnn_embedding_model():
-    model = Sequential([
-        Conv2D(32, (3, 3), activation='relu', input_shape=(160, 160, 1)),
-        MaxPooling2D(2, 2),
-        Conv2D(64, (3, 3), activation='relu'),
-        MaxPooling2D(2, 2),
-        Flatten(),
-        Dense(512, activation='relu'),
-        Dense(512, activation='linear')  # Final dense layer to produce a 512-dimensional embedding
-    ])
-    return model
-
-cnn_model = create_cnn_embedding_model()
-cnn_model.compile(optimizer='adam', loss='mse') 
-# Using MSE loss as we are not training for classification
+def embed_cnn_faces(gray_faces):
+    # Embed (N,160,160,1) grayscale crops scaled to [0, 1] with the CNN
+    faces = np.asarray(gray_faces, dtype=np.float32)
+    if INFERENCE_BATCHING:
+        return np.asarray(cnn_batcher.submit(faces))
+    return cnn_model.get().infer(faces)
+
+# Nearest-neighbour search over the gallery: "exact", "ivf" or "hnsw" (needs hnswlib)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "exact")
+SEARCH_OPTIONS = {
+    "ivf_nlist": int(os.getenv("IVF_NLIST", "0")),  # 0 = sqrt(gallery size)
+    "ivf_nprobe": int(os.getenv("IVF_NPROBE", "8")),  # more lists = higher recall, slower
+    "ivf_min_train_size": int(os.getenv("IVF_MIN_TRAIN_SIZE", "2048")),
+    "hnsw_m": int(os.getenv("HNSW_M", "16")),
+    "hnsw_ef_construction": int(os.getenv("HNSW_EF_CONSTRUCTION", "200")),
+    "hnsw_ef_search": int(os.getenv("HNSW_EF_SEARCH", "64")),  # higher = better recall, slower
+}
+
+class FaceGallery:
+    # Holds every registered FaceNet embedding as one L2-normalized float32
+    # matrix, so all faces in a frame are scored with a single matrix multiply
+    # instead of re-converting the gallery once per face.
+    # Rows live in a growable buffer and can be added, removed or have their
+    # role changed in place, so single-user edits never reload the collection.
+    # Lookups go through a pluggable search backend (see search_index.py).
+    # version changes on every edit and differs between gallery instances,
+    # so it can key caches of recognition results.
+    _versions = itertools.count(1)
+
+    def __init__(self, embeddings=None, labels=None, rollnumbers=None, roles=None,
+                 copy=True, normalized=False):
+        if embeddings is None or len(embeddings) == 0:
+            self._buffer = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        elif normalized:
+            # Already unit length, e.g. a memory-mapped snapshot; used as is
+            self._buffer = embeddings
+        else:
+            self._buffer = normalize_embeddings(embeddings, copy=copy)
+        self._size = self._buffer.shape[0]
+        self.labels = list(labels or [])  # id 1,2,3,.. per row
+        self.rollnumbers = list(rollnumbers or [])  # roll number per row
+        self.roles = list(roles or [])  # normalized role per row
+        self._rows = {roll: row for row, roll in enumerate(self.rollnumbers)}
+        self._lock = threading.RLock()
+        self.index = create_search_index(SEARCH_BACKEND, **SEARCH_OPTIONS)
+        self.index.rebuild(self.matrix)
+        self.version = next(FaceGallery._versions)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, rollnumber):
+        return rollnumber in self._rows
+
+    @property
+    def matrix(self):
+        return self._buffer[:self._size]
+
+    def add(self, label, rollnumber, role, embedding):
+        # Insert a user, or overwrite the row if the roll number is already known
+        vector = normalize_embeddings(embedding)[0]
+        with self._lock:
+            row = self._rows.get(rollnumber)
+            if row is None:
+                if self._size == self._buffer.shape[0]:
+                    # Grow geometrically so repeated registrations stay amortized O(1)
+                    grown = np.zeros((max(16, 2 * self._size), EMBEDDING_DIM), dtype=np.float32)
+                    grown[:self._size] = self.matrix
+                    self._buffer = grown
+                row = self._size
+                self._size += 1
+                self.labels.append(label)
+                self.rollnumbers.append(rollnumber)
+                self.roles.append(role)
+                self._rows[rollnumber] = row
+            else:
+                self.labels[row] = label
+                self.roles[row] = role
+            self._buffer[row] = vector
+            self.index.add(row, self.matrix)
+            self.version = next(FaceGallery._versions)
+
+    def remove(self, rollnumber):
+        # Move the last row into the freed slot so the matrix stays dense
+        with self._lock:
+            row = self._rows.pop(rollnumber, None)
+            if row is None:
+                return False
+            last = self._size - 1
+            self.index.remove(row)
+            if row != last:
+                self.index.move(last, row)
+                self._buffer[row] = self._buffer[last]
+                self.labels[row] = self.labels[last]
+                self.rollnumbers[row] = self.rollnumbers[last]
+                self.roles[row] = self.roles[last]
+                self._rows[self.rollnumbers[row]] = row
+            self.labels.pop()
+            self.rollnumbers.pop()
+            self.roles.pop()
+            self._size = last
+            self.version = next(FaceGallery._versions)
+            return True
+
+    def label_for(self, rollnumber):
+        # Numeric user id of a registered roll number, or None
+        with self._lock:
+            row = self._rows.get(rollnumber)
+            return None if row is None else self.labels[row]
+
+    def update_role(self, rollnumber, role):
+        with self._lock:
+            row = self._rows.get(rollnumber)
+            if row is None:
+                return False
+            self.roles[row] = role
+            self.version = next(FaceGallery._versions)
+            return True
+
+    def snapshot_state(self):
+        # Consistent copy of the gallery contents for writing a snapshot
+        with self._lock:
+            return (
+                self.matrix.copy(),
+                list(self.labels),
+                list(self.rollnumbers),
+                list(self.roles),
+            )
+
+    def match(self, embeddings, threshold=RECOGNITION_THRESHOLD):
+        # Returns (roll number or None, role or None, best similarity) per query
+        queries = normalize_embeddings(embeddings)
+        with self._lock:
+            if self._size == 0:
+                return [(None, None, 0.0) for _ in range(len(queries))]
+            best_rows, best_scores = self.index.search(queries, self.matrix)
+            return [
+                (self.rollnumbers[row], self.roles[row], float(score))
+                if score > threshold
+                else (None, None, float(score))
+                for row, score in zip(best_rows, best_scores)
+            ]
 
 def cosine(embedding1, embedding2):
     dot_product = np.dot(embedding1, embedding2)
@@ -132,6 +756,7 @@ def cosine(embedding1, embedding2):
     return similarity
 
 @app.route('/CNN-login', methods=['POST'])
+@requires_pipelines("cnn")
 def cnnlogin():
     # Check for uploaded image
     if 'image' not in request.files:
@@ -148,39 +773,48 @@ def cnnlogin():
     # Collection name 'data' is already correctly used here
     user_data = mongo.db.data.find_one(
         {"RollNumber": rollnumber},
-        {"CNN_embeddings": 1, "username": 1, "role": 1, "RollNumber": 1},
+        {
+            "CNN_embeddings": 1, "cnn_model_version": 1, "cnn_detector": 1,
+            "username": 1, "role": 1, "RollNumber": 1,
+        },
     )
     if user_data is None:
         return jsonify({"error": "User not found"}), 404
-    stored_cnn_embedding = np.array(user_data["CNN_embeddings"])# Convert stored embeddings to NumPy array
+    stored_cnn_embedding = decode_embedding(user_data["CNN_embeddings"])# Convert stored embeddings to NumPy array
     username = user_data["username"]
     role = normalize_role(user_data.get("role"), user_data.get("RollNumber", rollnumber))
     print(username)
     # Decode image
-    image_data = file.read()
-    image_array = np.frombuffer(image_data, np.uint8)
-    image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+    image = decode_image(file.read())
     if image is None:
         return jsonify({"error": "Invalid image"}), 400
-    # Initialize Haar Cascade
 
-    # Detect the face using Haar Cascade
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    faces = haar_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(100, 100))
+    # Detect the face with the same detector the CNN enrolment used
+    faces = detect_face_boxes(image, CNN_LOGIN_DETECTOR, CNN_LOGIN_DETECT_SIZE)
     if len(faces) == 0:
         return jsonify({"error": "No face detected"}), 400
 
     # Process the first detected face
-    x, y, w, h = faces[0]
-    cropped_face = cv2.resize(image[y:y+h, x:x+w], (160, 160))
+    face = crop_faces(image, faces[:1])[0]
 
     # Preprocess face for CNN model
-    gray_face = cv2.cvtColor(cropped_face, cv2.COLOR_BGR2GRAY).reshape(160, 160, 1)
-    normalized_face = np.expand_dims(gray_face, axis=-1)
-    normalized_face = np.expand_dims(normalized_face, axis=0)
+    gray_face = face.gray.reshape(160, 160, 1)
+    normalized_face = np.expand_dims(gray_face, axis=0)
     normalized_face = normalized_face / 255.0  # Normalize pixel values to [0, 1]
     # Generate embedding using the CNN model
-    cnn_embedding = cnn_model.predict(normalized_face)[0]
+    cnn_embedding = embed_cnn_faces(normalized_face)[0]
+    stored_version = user_data.get("cnn_model_version")
+    if stored_version and stored_version != cnn_model.get().version:
+        print(
+            f"Warning: {rollnumber} was enrolled with CNN weights {stored_version}, "
+            f"serving {cnn_model.get().version}"
+        )
+    stored_detector = user_data.get("cnn_detector", LEGACY_CNN_DETECTOR)
+    if stored_detector != CNN_LOGIN_DETECTOR:
+        print(
+            f"Warning: {rollnumber} was enrolled with {stored_detector} face crops, "
+            f"CNN_LOGIN_DETECTOR is {CNN_LOGIN_DETECTOR}"
+        )
     print("CNN shape: ",cnn_embedding.shape,"Stored shape: ",stored_cnn_embedding.shape)
     # Compare the embedding with stored embeddings
     similarity = cosine(cnn_embedding, stored_cnn_embedding)
@@ -196,6 +830,7 @@ def cnnlogin():
         return jsonify({"error": "Face not recognized", "probability": float(similarity)}), 401
 
 @app.route('/login', methods=['POST'])
+@requires_pipelines("facenet")
 def recognizeLogin():
     if 'image' not in request.files:
         return jsonify({"error": "No image provided"}), 400
@@ -203,27 +838,22 @@ def recognizeLogin():
     file = request.files['image']
     name = request.form["rollnumber"]
     name = name.upper()
-    image_data = file.read()
-    image_array = np.frombuffer(image_data, np.uint8)
-    image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)   
+    image = decode_image(file.read())
     if image is None:
         return jsonify({"error": "Invalid image"}), 400
-    results = recognize_faces_in_image(image)
+    results = recognize_faces_in_image(image, LOGIN_DETECTOR, LOGIN_DETECT_SIZE)
     print(results)
     if not results or len(results) == 0:
         return jsonify({"error": "No faces detected in the image"}), 400
     if (results[0]['name']==name):
         print("done")
         today = datetime.now().strftime("%Y-%m-%d")
-        # Collection name 'attendance1' is already correctly used here
-        mongo.db.attendance1.update_one(
-                {'username': results[0]['name']},
-                {'$set': {today: True}},  # Mark as present for today
-                upsert=True
-            )
         user_data = mongo.db.data.find_one(
             {"RollNumber": name},
-            {"role": 1, "RollNumber": 1},
+            {"role": 1, "RollNumber": 1, "id": 1},
+        )
+        record_attendance(
+            results[0]['name'], user_data.get("id") if user_data else None, today
         )
         print(f"DEBUG - User data from DB: {user_data}")
         print(f"DEBUG - Role from DB: {user_data.get('role') if user_data else None}")
@@ -248,14 +878,122 @@ def recognizeLogin():
     else:
         return jsonify({'name':"user not recognised"})
 
+# Face detection stage shared by the FaceNet and CNN pipelines: one detector
+# pass per image yields both an RGB crop (FaceNet) and a gray crop (CNN).
+# Each endpoint picks its own backend (haar < dnn < mtcnn in cost and
+# accuracy); run `python bench_detectors.py <images>` to compare them on
+# your own cameras. CNN embeddings only compare well when /CNN-login crops
+# faces with the same detector as the enrolment, so CNN_LOGIN_DETECTOR also
+# picks the CNN crop in /register. It defaults to Haar, which produced every
+# CNN embedding stored before detectors were configurable; users record the
+# detector their CNN embedding came from in "cnn_detector".
+def _detector_setting(setting, default):
+    value = os.getenv(setting, default).strip().lower()
+    if value not in DETECTOR_BACKENDS:
+        print(f"Warning: Unknown {setting} '{value}' - using {default}")
+        return default
+    return value
+
+REGISTER_DETECTOR = _detector_setting("REGISTER_DETECTOR", "mtcnn")
+CNN_LOGIN_DETECTOR = _detector_setting("CNN_LOGIN_DETECTOR", "haar")
+# Detector assumed for users enrolled before "cnn_detector" was stored
+LEGACY_CNN_DETECTOR = "haar"
+LOGIN_DETECTOR = _detector_setting("LOGIN_DETECTOR", "mtcnn")
+RECOGNIZE_DETECTOR = _detector_setting("RECOGNIZE_DETECTOR", "mtcnn")
+
+# Long edge (pixels) each endpoint shrinks uploads to before detection; 0
+# detects at full resolution. Crops are still cut from the full-resolution
+# image, so only detection cost changes. Group photos need a larger size
+# than selfies for small faces to stay detectable.
+REGISTER_DETECT_SIZE = int(os.getenv("REGISTER_DETECT_SIZE", "640"))
+CNN_LOGIN_DETECT_SIZE = int(os.getenv("CNN_LOGIN_DETECT_SIZE", "640"))
+LOGIN_DETECT_SIZE = int(os.getenv("LOGIN_DETECT_SIZE", "640"))
+RECOGNIZE_DETECT_SIZE = int(os.getenv("RECOGNIZE_DETECT_SIZE", "1280"))
+FaceCrop = namedtuple("FaceCrop", ["box", "rgb", "gray"])
+
+def detect_face_boxes(image, detector_name="mtcnn", max_side=0):
+    # [x, y, w, h] boxes in detection order from the chosen detector, in
+    # full-resolution coordinates even when detection ran on a smaller copy
+    small, scale = downscale(image, max_side)
+    boxes = [
+        tuple(face["box"])
+        for face in face_detectors[detector_name].get().detect(small, scale)
+    ]
+    if scale == 1.0:
+        return boxes
+    return [tuple(int(round(value / scale)) for value in box) for box in boxes]
+
+def crop_faces(image, boxes):
+    crops = []
+    for x, y, w, h in boxes:
+        x, y = max(0, x), max(0, y)
+        cropped_face = cv2.resize(image[y:y+h, x:x+w], (160, 160))
+        crops.append(
+            FaceCrop(
+                (x, y, w, h),
+                cv2.cvtColor(cropped_face, cv2.COLOR_BGR2RGB),
+                cv2.cvtColor(cropped_face, cv2.COLOR_BGR2GRAY),
+            )
+        )
+    return crops
+
+# Registration expects image0..image4; each is decoded, detected and cropped on a pool thread
+REGISTRATION_IMAGE_COUNT = 5
+registration_pool = ThreadPoolExecutor(
+    max_workers=max(1, int(os.getenv("REGISTRATION_WORKERS", str(REGISTRATION_IMAGE_COUNT)))),
+    thread_name_prefix="register",
+)
+
+def detect_registration_faces(image_data):
+    # Returns (RGB 160x160 crop for FaceNet or None, gray 160x160 crop for the CNN or None)
+    image = decode_image(image_data)
+    if image is None:
+        return None, None
+
+    boxes = detect_face_boxes(image, REGISTER_DETECTOR, REGISTER_DETECT_SIZE)
+    face = crop_faces(image, boxes[:1])[0] if boxes else None
+    if (CNN_LOGIN_DETECTOR, CNN_LOGIN_DETECT_SIZE) == (REGISTER_DETECTOR, REGISTER_DETECT_SIZE):
+        # One detection pass; the first face feeds both embedders
+        cnn_face = face
+    else:
+        # The CNN crop comes from the detector /CNN-login uses
+        cnn_boxes = detect_face_boxes(image, CNN_LOGIN_DETECTOR, CNN_LOGIN_DETECT_SIZE)
+        cnn_face = crop_faces(image, cnn_boxes[:1])[0] if cnn_boxes else None
+    return (
+        face.rgb if face is not None else None,
+        cnn_face.gray if cnn_face is not None else None,
+    )
+
+# User ids come from a counter document, so concurrent registrations on any
+# worker never share one (daily attendance rosters are keyed by id)
+USER_ID_COUNTER = "user_id"
+
+def next_user_id():
+    counter = mongo.db.counters.find_one_and_update(
+        {"_id": USER_ID_COUNTER},
+        {"$inc": {"value": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if counter is not None:
+        return counter["value"]
+    # First registration since the counter was introduced: seed it with the
+    # highest id in use; count + 1 would reuse ids after a delete
+    last_user = mongo.db.data.find_one({}, {"id": 1}, sort=[("id", -1)])
+    try:
+        mongo.db.counters.insert_one(
+            {"_id": USER_ID_COUNTER, "value": (last_user.get("id") or 0) if last_user else 0}
+        )
+    except DuplicateKeyError:
+        pass  # another worker seeded it first
+    return next_user_id()
+
 @app.route('/register', methods=['POST'])
+@requires_pipelines("facenet", "cnn")
 def register():
     rollnumber = request.form["RollNumber"].upper()
     username = request.form['Username']
     fathername = request.form["FatherName"]
     phoneno = request.form["phoneNumber"]
-    facenet_embeddings, cnn_embeddings = [], []
-    stored_image = None  # To store the first grayscale image
 
     print(username)
     # Check if user already exists
@@ -268,92 +1006,74 @@ def register():
         return jsonify({"error": f"User '{username}' already exists"}), 400
 
     # Process uploaded images
-    for i in range(5):  # Expecting 5 images
+    images = []
+    for i in range(REGISTRATION_IMAGE_COUNT):  # Expecting 5 images
         try:
             image_file = request.files[f'image{i}']
         except KeyError:
             return jsonify({"error": f"Missing image{i} in the request"}), 400
+        images.append(image_file.read())
+
+    # Decode, downscale and crop all images in parallel (OpenCV releases the
+    # GIL); detection itself overlaps only with Haar (one cascade per thread),
+    # while MTCNN and DNN serialize on their detector lock
+    detections = list(registration_pool.map(detect_registration_faces, images))
+    rgb_faces = [rgb_face for rgb_face, _ in detections if rgb_face is not None]
+    gray_faces = [gray_face for _, gray_face in detections if gray_face is not None]
 
-        image_data = image_file.read()
-        image_array = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-
-        # Face detection using MTCNN for FaceNet
-        mtcnn_faces = detector.detect_faces(image)
-        if mtcnn_faces:
-            # Get the first detected face for FaceNet embedding
-            x, y, w, h = mtcnn_faces[0]['box']
-            x, y = max(0, x), max(0, y)
-            cropped_face = cv2.resize(image[y:y+h, x:x+w], (160, 160))
-            rgb_face = cv2.cvtColor(cropped_face, cv2.COLOR_BGR2RGB)
-
-            # Get FaceNet embedding
-            facenet_embedding = embedder.embeddings(np.expand_dims(rgb_face, axis=0)).flatten()
-            facenet_embeddings.append(facenet_embedding)
-        # Face detection using Haar Cascade for CNN
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        haar_faces = haar_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(100, 100))
-        if len(haar_faces) > 0:
-            x, y, w, h = haar_faces[0]
-            cropped_face = cv2.resize(image[y:y+h, x:x+w], (160, 160))
-            gray_face = cv2.cvtColor(cropped_face, cv2.COLOR_BGR2GRAY).reshape(160, 160, 1)
-            normalized_face=np.expand_dims(gray_face, axis=-1) #dimnesion
-            normalized_face=np.expand_dims(normalized_face, axis=0) #batch
-            normalized_face = normalized_face / 255.0 #0-1
-            # Get CNN embedding
-            cnn_embedding = cnn_model.predict(normalized_face)[0]
-            cnn_embeddings.append(cnn_embedding)
-            # Save the first grayscale face as base64
-            if stored_image is None:
-                _, buffer = cv2.imencode('.jpg', cv2.cvtColor(cropped_face, cv2.COLOR_BGR2GRAY))
-                stored_image = base64.b64encode(buffer).decode('utf-8')
-
-    if not facenet_embeddings or not cnn_embeddings:
+    if not rgb_faces or not gray_faces:
         return jsonify({"error": "No valid faces detected in the uploaded images"}), 400
 
+    # One FaceNet batch and one CNN batch for all images
+    facenet_embeddings = embed_faces(rgb_faces)
+    normalized_faces = np.asarray(gray_faces, dtype=np.float32)[..., np.newaxis] / 255.0 #0-1
+    # Embedded directly (one batch already) so the weights version is known
+    loaded_cnn = cnn_model.get()
+    cnn_embeddings = loaded_cnn.infer(normalized_faces)
+
+    # Save the first grayscale face as base64
+    _, buffer = cv2.imencode('.jpg', gray_faces[0])
+    stored_image = base64.b64encode(buffer).decode('utf-8')
+
     # Calculate mean embeddings
-    mean_facenet_embedding = np.mean(facenet_embeddings, axis=0).astype(float).tolist()
-    mean_cnn_embedding = np.mean(cnn_embeddings, axis=0).astype(float).tolist()
-    
-    # Save model weights with error handling
-    try:
-        weights_path = os.path.join(app_data_path, 'cnn_model.weights.h5')
-        cnn_model.save_weights(weights_path)
-    except Exception as e:
-        print(f"Warning: Could not save model weights: {e}")
-        # Try saving in current directory
-        try:
-            cnn_model.save_weights('cnn_model.weights.h5')
-        except Exception as e2:
-            print(f"Warning: Could not save model weights in current directory: {e2}")
+    mean_facenet_embedding = np.mean(facenet_embeddings, axis=0)
+    mean_cnn_embedding = np.mean(cnn_embeddings, axis=0)
     
     # Create user data
     # Collection name 'data' is already correctly used here
-    id = mongo.db.data.count_documents({}) + 1
+    id = next_user_id()
     user_data = {
         'RollNumber': rollnumber,
         'username': username,
         'FatherName': fathername,
         'phoneNumber': phoneno,
         'role': DEFAULT_ROLE,
-        'embeddings': mean_facenet_embedding,
-        'CNN_embeddings': mean_cnn_embedding,
+        'embeddings': encode_embedding(mean_facenet_embedding, EMBEDDING_STORAGE),
+        'CNN_embeddings': encode_embedding(mean_cnn_embedding, EMBEDDING_STORAGE),
+        'cnn_model_version': loaded_cnn.version,
+        'cnn_detector': CNN_LOGIN_DETECTOR,
         'stored_image': stored_image,
         'id': id
     }
 
     # Insert into MongoDB
     mongo.db.data.insert_one(user_data)
-    # Collection name 'attendance1' is already correctly used here
-    mongo.db.attendance1.insert_one({"username": rollnumber, "id": id})
-    # Reload embeddings
-    reload_embeddings()
+    if ATTENDANCE_SCHEMA == "legacy":
+        # Collection name 'attendance1' is already correctly used here
+        mongo.db.attendance1.insert_one({"username": rollnumber, "id": id})
+    # Add the new user to the in-memory gallery
+    gallery.add(id, rollnumber, DEFAULT_ROLE, mean_facenet_embedding)
+    bump_gallery_generation()
+    response_cache.bump("users", "attendance")
 
     return jsonify({"message": "User registered successfully!"}), 201
 
 # Load embeddings from MongoDB for recognition
 @app.route('/get_users', methods=['GET'])
 def get_users():
+    return cached_json_response("get_users", ("users",), build_users_payload)
+
+def build_users_payload():
     # Collection name 'data' is already correctly used here
     users = list(
         mongo.db.data.find({}, {"id": 1, "username": 1, "RollNumber": 1, "role": 1})
@@ -373,79 +1093,168 @@ def get_users():
                 "role": str(role) if role else "user",
             }
         )
-    return jsonify({"users": formatted_users, "count": user_count})
+    return {"users": formatted_users, "count": user_count}, 200
+
+# Number of user documents fetched per round trip when building the gallery
+GALLERY_LOAD_BATCH_SIZE = max(1, int(os.getenv("GALLERY_LOAD_BATCH_SIZE", "500")))
+# Only the fields the gallery needs; skips stored_image and profile details
+GALLERY_PROJECTION = {"_id": 0, "embeddings": 1, "id": 1, "RollNumber": 1, "role": 1}
+
+def fetch_gallery_rows():
+    # (embeddings, ids, roll numbers, roles) of every registered user; raises
+    # when MongoDB cannot be read
+    started = time.perf_counter()
+    # Raw documents expose their encoded size and are decoded lazily
+    collection = mongo.db.data.with_options(
+        codec_options=CodecOptions(document_class=RawBSONDocument)
+    )
+    face_data = np.empty(
+        (collection.estimated_document_count(), EMBEDDING_DIM), dtype=np.float32
+    )# facenet embeddings, preallocated
+    labels = [] # id 1,2,3,..
+    rollnumbers = []
+    roles = []
+    bytes_transferred = 0
+    cursor = collection.find({}, GALLERY_PROJECTION, batch_size=GALLERY_LOAD_BATCH_SIZE)
+    for user in cursor:
+        if "embeddings" not in user:
+            continue
+        bytes_transferred += len(user.raw)
+        row = len(labels)
+        if row == face_data.shape[0]:
+            # Collection grew since the count estimate was taken
+            face_data = np.concatenate(
+                [face_data, np.empty((max(16, row), EMBEDDING_DIM), dtype=np.float32)]
+            )
+        face_data[row] = decode_embedding(user["embeddings"])
+        labels.append(user['id'])
+        rollnumbers.append(user['RollNumber'])
+        roles.append(normalize_role(user.get("role"), user.get("RollNumber")))
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Loaded {len(labels)} user embeddings from database in {elapsed:.2f}s "
+        f"({bytes_transferred / 1024:.1f} KiB transferred)"
+    )
+    return face_data[:len(labels)], labels, rollnumbers, roles
+
+# Gallery snapshot shared by all workers (see gallery_snapshot.py)
+GALLERY_SNAPSHOT_PATH = os.getenv(
+    "GALLERY_SNAPSHOT_PATH", os.path.join(app_data_path, "gallery.snapshot")
+)
+# Snapshots older than this many seconds are rebuilt from MongoDB; 0 disables snapshots
+GALLERY_SNAPSHOT_MAX_AGE = float(os.getenv("GALLERY_SNAPSHOT_MAX_AGE", "3600"))
+
+# Change counter of the gallery contents in MongoDB, shared by every worker.
+# Snapshots record the generation they were built from and are rejected
+# once any worker has registered, re-roled or deleted a user since; the next
+# worker to start then reloads from MongoDB and writes a fresh snapshot.
+GALLERY_GENERATION_ID = "gallery"
+
+def gallery_generation():
+    counter = mongo.db.counters.find_one({"_id": GALLERY_GENERATION_ID})
+    return counter.get("generation", 0) if counter else 0
+
+def bump_gallery_generation():
+    mongo.db.counters.update_one(
+        {"_id": GALLERY_GENERATION_ID}, {"$inc": {"generation": 1}}, upsert=True
+    )
 
-def load_embeddings_from_db():
-    if mongo is None:
-        print("MongoDB not connected - returning empty embeddings")
-        return [], [], {}, {}
-    
+def save_gallery_snapshot(matrix, labels, rollnumbers, roles, generation):
+    # matrix rows must already be L2-normalized
+    if GALLERY_SNAPSHOT_MAX_AGE <= 0:
+        return
     try:
-        users = list(mongo.db.data.find())
-        face_data = []# facenet embeddings
-        labels = [] # id 1,2,3,..
-        names = {} #dict of id and roll number
-        roles = {}
-        # {"1":vinay,"2":shahank}
-        for user in users:
-            face_data.append(user["embeddings"])
-            labels.append(user['id'])  # Keep the ObjectId
-            names[user['id']] = user['RollNumber']  # Use ObjectId as key
-            roles[user['id']] = normalize_role(user.get("role"), user.get("RollNumber"))
-
-        print(f"Loaded {len(face_data)} user embeddings from database")
-        return (face_data, labels, names, roles) if face_data else ([], [], {}, {})
+        write_snapshot(GALLERY_SNAPSHOT_PATH, matrix, labels, rollnumbers, roles, generation)
+        print(
+            f"Saved gallery snapshot with {len(labels)} users "
+            f"(generation {generation}) to {GALLERY_SNAPSHOT_PATH}"
+        )
     except Exception as e:
-        print(f"Error loading embeddings from database: {e}")
-        return [], [], {}, {}
+        print(f"Warning: Could not save gallery snapshot: {e}")
 
-# Load face embeddings from MongoDB initially
-face_data, labels, names, roles = load_embeddings_from_db()
-
-# Load CNN model weights with error handling
-try:
-    weights_path = os.path.join(app_data_path, 'cnn_model.weights.h5')
-    if os.path.exists(weights_path):
-        cnn_model.load_weights(weights_path)
-        print("Loaded CNN model weights from app_data directory")
-    elif os.path.exists('cnn_model.weights.h5'):
-        cnn_model.load_weights('cnn_model.weights.h5')
-        print("Loaded CNN model weights from current directory")
-    else:
-        print("No existing CNN model weights found - will use initialized weights")
-except Exception as e:
-    print(f"Warning: Could not load CNN model weights: {e}")
-
-# Reload embeddings to update after a new registration
-def reload_embeddings():
-    global face_data, labels, names, roles
+def load_gallery():
+    # Returns (gallery, loaded); loaded is False when MongoDB could not be read.
+    # Prefers a memory-mapped snapshot of the current database generation and
+    # falls back to MongoDB, refreshing the snapshot
+    if GALLERY_SNAPSHOT_MAX_AGE > 0:
+        try:
+            snapshot = read_snapshot(
+                GALLERY_SNAPSHOT_PATH,
+                max_age=GALLERY_SNAPSHOT_MAX_AGE,
+                generation=gallery_generation(),
+            )
+        except Exception as e:
+            print(f"Warning: Could not read gallery snapshot: {e}")
+            snapshot = None
+        if snapshot is not None:
+            matrix, snapshot_labels, snapshot_rollnumbers, snapshot_roles = snapshot
+            print(f"Loaded {len(snapshot_labels)} user embeddings from gallery snapshot")
+            return FaceGallery(
+                matrix, snapshot_labels, snapshot_rollnumbers, snapshot_roles,
+                copy=False, normalized=True,
+            ), True
     try:
-        weights_path = os.path.join(app_data_path, 'cnn_model.weights.h5')
-        if os.path.exists(weights_path):
-            cnn_model.load_weights(weights_path)
-        elif os.path.exists('cnn_model.weights.h5'):
-            cnn_model.load_weights('cnn_model.weights.h5')
+        generation = gallery_generation()
+        face_data, labels, rollnumbers, roles = fetch_gallery_rows()
     except Exception as e:
-        print(f"Warning: Could not reload CNN model weights: {e}")
-    
-    face_data, labels, names, roles = load_embeddings_from_db()
+        print(f"Error loading embeddings from database: {e}")
+        return FaceGallery(), False
+    loaded = FaceGallery(face_data, labels, rollnumbers, roles, copy=False)
+    save_gallery_snapshot(*loaded.snapshot_state(), generation)
+    return loaded, True
+
+# Seconds between retries when the gallery could not be loaded at startup;
+# /readyz reports not ready until a retry succeeds
+GALLERY_LOAD_RETRY_INTERVAL = float(os.getenv("GALLERY_LOAD_RETRY_INTERVAL", "10"))
+
+def retry_gallery_load():
+    global gallery
+    while True:
+        time.sleep(GALLERY_LOAD_RETRY_INTERVAL)
+        loaded, ok = load_gallery()
+        if ok:
+            gallery = loaded
+            readiness["gallery"] = True
+            return
+
+# Load face embeddings from the snapshot or MongoDB initially; only the
+# FaceNet pipelines match against the gallery
+if pipeline_enabled("facenet") or pipeline_enabled("multiface"):
+    _gallery_started = time.perf_counter()
+    gallery, readiness["gallery"] = load_gallery()
+    record_startup_timing("load gallery", time.perf_counter() - _gallery_started)
+    if not readiness["gallery"]:
+        threading.Thread(target=retry_gallery_load, name="gallery-load", daemon=True).start()
+else:
+    gallery = FaceGallery()
+    readiness["gallery"] = True
+
+def _load_yolo():
+    from ultralytics import YOLO
+    # return YOLO('yolov5s.pt')  # Old model path
+    return YOLO('yolov5su.pt')  # Updated to use the improved YOLOv5 model
 
 # Recognize faces using MongoDB-stored embeddings
-# model = YOLO('yolov5s.pt')  # Old model path
-model = YOLO('yolov5su.pt')  # Updated to use the improved YOLOv5 model
+model = LazyModel("YOLO", _load_yolo)
+CROWD_DECODE_SIZE = int(os.getenv("CROWD_DECODE_SIZE", "1280"))
 
 @app.route('/crowd', methods=['POST'])
+@requires_pipelines("crowd")
 def upload_image():
     if 'image' not in request.files:
         return jsonify({'error': 'No image provided'}), 400
 
-    # Read the image from the request
+    # Read the image from the request; YOLO resizes to its own input size
+    # anyway, so decode straight at reduced scale (the annotated image is
+    # returned at that size too)
     file = request.files['image']
-    img_array = np.frombuffer(file.read(), np.uint8)
-    img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+    img = decode_image(file.read(), CROWD_DECODE_SIZE)
+    if img is None:
+        return jsonify({'error': 'Invalid image'}), 400
 
     # Perform YOLO detection
-    results = model.predict(source=img, conf=0.5) 
+    results = model.get().predict(source=img, conf=0.5) 
     print(results)# Confidence threshold
     detections = results[0].boxes.xyxy  # Bounding boxes
     labels = results[0].boxes.cls.cpu().numpy()  # Class labels
@@ -464,38 +1273,113 @@ def upload_image():
 
     return jsonify({'count': human_count, 'image': encoded_image})
 
-def recognize_faces_in_image(image):
-    if len(face_data) == 0:
+def recognize_faces_in_image(image, detector_name=RECOGNIZE_DETECTOR, detect_size=RECOGNIZE_DETECT_SIZE):
+    current_gallery = gallery
+    if len(current_gallery) == 0:
         return [{"name": "No registered faces", "probability": 0.0, "role": "unknown"}]
 
-    faces = detector.detect_faces(image)
+    boxes = detect_face_boxes(image, detector_name, detect_size)
+    if not boxes:
+        return []
+    return identify_faces(image, boxes, current_gallery)
+
+def identify_faces(image, boxes, current_gallery=None):
+    # {"name", "probability", "role"} for each [x, y, w, h] box of the image
+    # FaceGallery defines __len__, so an empty gallery is falsy
+    if current_gallery is None:
+        current_gallery = gallery
+    rgb_faces = [face.rgb for face in crop_faces(image, boxes)]
+
+    # Embed all crops of the frame together instead of one inference per face
+    embeddings = embed_faces(rgb_faces)
+
+    # Score every face against the whole gallery in one matrix multiply
     results = []
-    for face in faces:
-        x, y, width, height = face['box']
-        cropped_face = cv2.resize(image[y:y+height, x:x+width], (160, 160))
-        
-        # Convert cropped face to RGB
-        rgb_face = cv2.cvtColor(cropped_face, cv2.COLOR_BGR2RGB)
-        embedding = embedder.embeddings(np.expand_dims(rgb_face, axis=0)).flatten()  # Use RGB face here
-
-        # Compare with stored embeddings in MongoDB
-        similarities = cosine_similarity([embedding], face_data)
-        idx = np.argmax(similarities)
-        best_match = similarities[0][idx]
-
-        if best_match > 0.7:
-            recognized_id = labels[idx] # Get the ObjectId
-            recognized_name = names[recognized_id]  # Use ObjectId to get the username
-            role = roles.get(recognized_id, DEFAULT_ROLE)
-            results.append(
-                {"name": recognized_name, "probability": float(best_match), "role": role}
-            )
+    for rollnumber, role, score in current_gallery.match(embeddings):
+        if rollnumber is not None:
+            results.append({"name": rollnumber, "probability": score, "role": role})
         else:
             results.append(
-                {"name": "Unknown", "probability": float(best_match), "role": "unknown"}
+                {"name": "Unknown", "probability": score, "role": "unknown"}
             )
     return results
 
+# Results of /recognize and /user_recognize for recently seen frames, keyed
+# by a perceptual hash so a resubmitted, nearly identical frame skips
+# detection and embedding (see frame_cache.py). FRAME_CACHE_SIZE=0 disables it.
+FRAME_CACHE_SIZE = int(os.getenv("FRAME_CACHE_SIZE", "256"))
+FRAME_CACHE_TTL = float(os.getenv("FRAME_CACHE_TTL", "5"))
+FRAME_CACHE_HASH_SIZE = int(os.getenv("FRAME_CACHE_HASH_SIZE", "16"))
+FRAME_CACHE_MAX_DISTANCE = int(os.getenv("FRAME_CACHE_MAX_DISTANCE", "8"))
+frame_cache = FrameResultCache(FRAME_CACHE_SIZE, FRAME_CACHE_TTL, FRAME_CACHE_MAX_DISTANCE)
+
+def recognize_faces_cached(image):
+    if FRAME_CACHE_SIZE <= 0:
+        return recognize_faces_in_image(image)
+    namespace = (RECOGNIZE_DETECTOR, RECOGNIZE_DETECT_SIZE, gallery.version)
+    frame_hash = dhash(image, FRAME_CACHE_HASH_SIZE)
+    results = frame_cache.get(namespace, frame_hash)
+    if results is None:
+        results = recognize_faces_in_image(image)
+        frame_cache.put(namespace, frame_hash, results)
+    return results
+
+@app.route('/frame_cache', methods=['GET'])
+def frame_cache_stats():
+    return jsonify(frame_cache.stats())
+
+# Fixed cameras identify themselves with an X-Session-Id header (or a
+# "session" form field); their frames go through a per-session motion gate
+# so unchanged frames skip detection and only changed regions are searched
+# (see motion_gate.py). Clients without a session use the frame cache above.
+MOTION_GATE = os.getenv("MOTION_GATE", "true").strip().lower() in ("1", "true", "yes")
+motion_gate = MotionGate(
+    pixel_threshold=int(os.getenv("MOTION_PIXEL_THRESHOLD", "25")),
+    change_ratio=float(os.getenv("MOTION_CHANGE_RATIO", "0.01")),
+    max_roi_fraction=float(os.getenv("MOTION_MAX_ROI_FRACTION", "0.4")),
+    refresh_seconds=float(os.getenv("MOTION_REFRESH_SECONDS", "60")),
+)
+
+def recognize_faces_gated(image, session_id):
+    current_gallery = gallery
+    if len(current_gallery) == 0:
+        return recognize_faces_in_image(image)
+    decision = motion_gate.check(session_id, image, current_gallery.version)
+    if decision.skip:
+        return [result for _, result in decision.faces]
+
+    if decision.rois is None:
+        boxes = detect_face_boxes(image, RECOGNIZE_DETECTOR, RECOGNIZE_DETECT_SIZE)
+        faces = []
+    else:
+        boxes = []
+        for x, y, w, h in decision.rois:
+            region = np.ascontiguousarray(image[y:y+h, x:x+w])
+            for bx, by, bw, bh in detect_face_boxes(region, RECOGNIZE_DETECTOR, RECOGNIZE_DETECT_SIZE):
+                boxes.append((bx + x, by + y, bw, bh))
+        # Previous faces stay unless a new detection replaces them: one the
+        # detector misses inside a changed region is kept until the forced
+        # refresh instead of dropping out of the results and attendance
+        faces = [
+            (box, result) for box, result in decision.faces
+            if not any(boxes_overlap(box, new_box) for new_box in boxes)
+        ]
+    if boxes:
+        faces += list(zip(boxes, identify_faces(image, boxes, current_gallery)))
+    motion_gate.store(session_id, decision.reference, faces, current_gallery.version)
+    return [result for _, result in faces]
+
+def recognize_frame(image):
+    # Shared entry point of /recognize and /user_recognize
+    session_id = request.headers.get("X-Session-Id") or request.form.get("session")
+    if MOTION_GATE and session_id:
+        return recognize_faces_gated(image, session_id)
+    return recognize_faces_cached(image)
+
+@app.route('/motion_gate', methods=['GET'])
+def motion_gate_stats():
+    return jsonify(motion_gate.stats())
+
 @app.route('/users/<rollnumber>/role', methods=['PATCH'])
 def update_user_role(rollnumber):
     payload = request.get_json(silent=True) or {}
@@ -509,11 +1393,20 @@ def update_user_role(rollnumber):
         return jsonify({"error": "User not found"}), 404
 
     current_role = normalize_role(user.get("role"), user.get("RollNumber"))
-    if current_role == "admin" and role != "admin" and count_admins() <= 1:
-        return jsonify({"error": "Cannot remove the last admin"}), 400
-
-    mongo.db.data.update_one({"_id": user["_id"]}, {"$set": {"role": role}})
-    reload_embeddings()
+    demoting_admin = current_role == "admin" and role != "admin"
+    with admin_change_lock:
+        if demoting_admin and count_admins() <= 1:
+            return jsonify({"error": "Cannot remove the last admin"}), 400
+
+        mongo.db.data.update_one({"_id": user["_id"]}, {"$set": {"role": role}})
+        if demoting_admin and count_admins() == 0:
+            # Another worker demoted the other admin at the same time; undo ours
+            mongo.db.data.update_one({"_id": user["_id"]}, {"$set": {"role": "admin"}})
+            bump_gallery_generation()
+            return jsonify({"error": "Cannot remove the last admin"}), 400
+    gallery.update_role(rollnumber, role)
+    bump_gallery_generation()
+    response_cache.bump("users")
     return jsonify({"message": "Role updated", "role": role})
 
 @app.route('/users/<rollnumber>', methods=['DELETE'])
@@ -524,12 +1417,25 @@ def delete_user(rollnumber):
         return jsonify({"error": "User not found"}), 404
 
     current_role = normalize_role(user.get("role"), user.get("RollNumber"))
-    if current_role == "admin" and count_admins() <= 1:
-        return jsonify({"error": "Cannot delete the last admin"}), 400
-
-    mongo.db.data.delete_one({"_id": user["_id"]})
-    mongo.db.attendance1.delete_one({"username": rollnumber})
-    reload_embeddings()
+    with admin_change_lock:
+        if current_role == "admin" and count_admins() <= 1:
+            return jsonify({"error": "Cannot delete the last admin"}), 400
+
+        mongo.db.data.delete_one({"_id": user["_id"]})
+        if current_role == "admin" and count_admins() == 0:
+            # Another worker removed the other admin at the same time; undo ours
+            mongo.db.data.insert_one(user)
+            bump_gallery_generation()
+            return jsonify({"error": "Cannot delete the last admin"}), 400
+    if ATTENDANCE_SCHEMA == "daily":
+        mongo.db.attendance_days.update_many(
+            {"present": user.get("id")}, {"$pull": {"present": user.get("id")}}
+        )
+    else:
+        mongo.db.attendance1.delete_one({"username": rollnumber})
+    gallery.remove(rollnumber)
+    bump_gallery_generation()
+    response_cache.bump("users", "attendance")
     return jsonify({"message": "User deleted"})
 
 @app.route('/users/<username>/images', methods=['GET'])
@@ -547,70 +1453,426 @@ def get_user_images(username):
 
 #multi face
 @app.route('/recognize', methods=['POST'])
+@requires_pipelines("multiface")
 def recognize():
     if 'image' not in request.files:
         return jsonify({"error": "No image provided"}), 400
     file = request.files['image']
-    image_data = file.read()
-    image_array = np.frombuffer(image_data, np.uint8)
-    image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+    image = decode_image(file.read())
     
     if image is None:
         return jsonify({"error": "Invalid image"}), 400
 
-    results = recognize_faces_in_image(image)
+    results = recognize_frame(image)
     today = datetime.now().strftime("%Y-%m-%d")
     for result in results:
-        if result['name'] != "Unknown":  # Only log attendance for recognized users
-            # Collection name 'attendance1' is already correctly used here
-            mongo.db.attendance1.update_one(
-                {'username': result['name']},
-                {'$set': {today: True}},  # Mark as present for today
-                upsert=True
-            )
+        if result['role'] != "unknown":  # Only log attendance for recognized users
+            attendance_buffer.mark(result['name'], gallery.label_for(result['name']), today)
     return jsonify(results)
 
 # user multi face
 @app.route('/user_recognize', methods=['POST'])
+@requires_pipelines("multiface")
 def user_recognize():
     if 'image' not in request.files:
         return jsonify({"error": "No image provided"},), 400
 
     file = request.files['image']
-    image_data = file.read()
-    image_array = np.frombuffer(image_data, np.uint8)
-    image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+    image = decode_image(file.read())
     
     if image is None:
         return jsonify({"error": "Invalid image"}), 400
 
-    results = recognize_faces_in_image(image)
+    results = recognize_frame(image)
     return jsonify(results)
 
+# Streaming multi face: the live feed posts one long multipart request
+# (multipart/form-data or multipart/x-mixed-replace, one JPEG per part) and
+# reads one NDJSON line per frame back. Faces are tracked between frames, so
+# the detector runs every STREAM_REDETECT_INTERVAL frames and a face is only
+# embedded when its track is new or its identity is stale.
+# A stream holds its worker for as long as the camera is connected: serve it
+# with a threaded gunicorn worker (see Procfile.txt), since a sync worker would
+# block every other endpoint and be killed after its 30 s timeout.
+STREAM_REDETECT_INTERVAL = int(os.getenv("STREAM_REDETECT_INTERVAL", "5"))
+STREAM_REFRESH_FRAMES = int(os.getenv("STREAM_REFRESH_FRAMES", "150"))
+STREAM_UNKNOWN_REFRESH_FRAMES = int(os.getenv("STREAM_UNKNOWN_REFRESH_FRAMES", "15"))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def multipart_parts(stream, boundary):
+    # Yields the body of each multipart part as soon as its closing delimiter
+    # line arrives. Parsed here rather than with Werkzeug's MultipartDecoder,
+    # which rejects parts without a Content-Disposition header, i.e. every
+    # MJPEG (multipart/x-mixed-replace) part. Part headers are skipped.
+    # The body is read line by line: read(n) on a chunked wsgi.input blocks
+    # until n bytes arrive, holding each frame back until the next ones do,
+    # while readline() returns at the CRLF that precedes every delimiter.
+    delimiter = b"\r\n--" + boundary.encode()
+    # Leading CRLF lets the first delimiter match at the start of the body
+    buffer = bytearray(b"\r\n")
+    state = "preamble"  # preamble -> headers -> body -> headers -> ...
+    scanned = 0  # buffer prefix already searched for the delimiter
+    while True:
+        chunk = stream.readline(STREAM_CHUNK_SIZE)
+        buffer += chunk
+        while True:
+            if state == "headers":
+                if len(buffer) < 2:
+                    break
+                if buffer[:2] == b"--":
+                    return  # closing delimiter
+                end = buffer.find(b"\r\n\r\n")
+                if end < 0:
+                    break
+                del buffer[:end + 4]
+                state = "body"
+            else:
+                end = buffer.find(delimiter, scanned)
+                if end < 0:
+                    # JPEG data holds many newlines; only rescan the tail
+                    scanned = max(0, len(buffer) - len(delimiter) + 1)
+                    break
+                if state == "body":
+                    yield bytes(buffer[:end])
+                del buffer[:end + len(delimiter)]
+                scanned = 0
+                state = "headers"
+        if not chunk:
+            if state != "preamble":
+                raise ValueError("Truncated multipart stream")
+            return
+
+@app.route('/recognize_stream', methods=['POST'])
+@requires_pipelines("multiface")
+def recognize_stream():
+    boundary = request.mimetype_params.get("boundary")
+    if not request.mimetype.startswith("multipart/") or not boundary:
+        return jsonify({"error": "Expected a multipart stream of images"}), 400
+    # ?attendance=true marks attendance like /recognize, once per person per stream
+    mark_attendance = request.args.get("attendance", "").strip().lower() in ("1", "true", "yes")
+    stream = request.stream
+    tracker = FaceTracker(
+        redetect_interval=STREAM_REDETECT_INTERVAL,
+        refresh_frames=STREAM_REFRESH_FRAMES,
+        unknown_refresh_frames=STREAM_UNKNOWN_REFRESH_FRAMES,
+    )
+
+    def generate():
+        marked = set()
+        try:
+            for frame_number, frame_data in enumerate(multipart_parts(stream, boundary)):
+                if not frame_data:
+                    yield json.dumps({"frame": frame_number, "error": "Empty frame"}) + "\n"
+                    continue
+                image = decode_image(frame_data)
+                if image is None:
+                    yield json.dumps({"frame": frame_number, "error": "Invalid image"}) + "\n"
+                    continue
+
+                detected = tracker.advance()
+                if detected:
+                    boxes = detect_face_boxes(image, RECOGNIZE_DETECTOR, RECOGNIZE_DETECT_SIZE)
+                    stale_tracks = tracker.update(boxes)
+                    if stale_tracks:
+                        identities = identify_faces(image, [track.int_box() for track in stale_tracks])
+                        for track, identity in zip(stale_tracks, identities):
+                            tracker.identify(track, identity)
+
+                faces = []
+                for track in tracker.tracks:
+                    if track.missed or track.identity is None:
+                        continue
+                    identity = track.identity
+                    faces.append({"track": track.track_id, "box": list(track.int_box()), **identity})
+                    if mark_attendance and identity["role"] != "unknown" and identity["name"] not in marked:
+                        marked.add(identity["name"])
+                        today = datetime.now().strftime("%Y-%m-%d")
+                        attendance_buffer.mark(identity["name"], gallery.label_for(identity["name"]), today)
+                yield json.dumps({"frame": frame_number, "detected": detected, "faces": faces}) + "\n"
+        except ValueError as e:
+            # Malformed or truncated multipart body
+            yield json.dumps({"error": f"Invalid stream: {e}"}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
 @app.route('/user_attendance/<username>', methods=['GET'])
 def get_user_attendance(username):
+    return cached_json_response(
+        f"user_attendance:{username}",
+        ("users", "attendance"),
+        lambda: build_user_attendance_payload(username),
+    )
+
+def build_user_attendance_payload(username):
     # Check if the user exists in the database
     # Collection name 'data' is already correctly used here
-    user = mongo.db.data.find_one({'RollNumber': username})
+    user = mongo.db.data.find_one({'RollNumber': username}, {"username": 1, "id": 1})
     if user is None:
-        return jsonify({"error": "User not found"}), 404
+        return {"error": "User not found"}, 404
     print(user['username'])
+    if ATTENDANCE_SCHEMA == "daily":
+        # Days whose roster contains the user's id
+        days = mongo.db.attendance_days.find(
+            {"present": user.get("id")}, {"_id": 0, "date": 1}
+        )
+        return {day["date"]: True for day in days}, 200
     # Fetch the attendance data for the user
     # Collection name 'attendance1' is already correctly used here
     attendance = mongo.db.attendance1.find_one({'username': username}, {'_id': 0,"username":0,"id":0})
     print(attendance)
     if attendance is None:
-        return jsonify({"error": "No attendance data found"}), 404
+        return {"error": "No attendance data found"}, 404
 
     # Return the attendance data
-    return jsonify(attendance)
+    return attendance, 200
+
+# /attendance pagination: default and maximum page size
+ATTENDANCE_PAGE_SIZE = 100
+ATTENDANCE_MAX_PAGE_SIZE = 1000
+ATTENDANCE_QUERY_PARAMS = ("limit", "after", "from", "to", "rollnumber", "format")
+DATE_KEY_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    datetime.strptime(value, "%Y-%m-%d")  # raises ValueError when malformed
+    return value
+
+def date_in_range(day, date_from, date_to):
+    # YYYY-MM-DD strings sort chronologically
+    return (date_from is None or day >= date_from) and (date_to is None or day <= date_to)
+
+def date_range_query(date_from, date_to):
+    bounds = {}
+    if date_from:
+        bounds["$gte"] = date_from
+    if date_to:
+        bounds["$lte"] = date_to
+    return {"date": bounds} if bounds else {}
+
+def roll_query(rollnumber, after):
+    condition = {}
+    if rollnumber:
+        condition["$eq"] = rollnumber
+    if after:
+        condition["$gt"] = after
+    return condition
 
 #attendance
 @app.route('/attendance',methods=['GET'])
 def get_attendance():
+    if not any(param in request.args for param in ATTENDANCE_QUERY_PARAMS):
+        # Unfiltered request: full attendance sheet, as the dashboard expects
+        if ATTENDANCE_SCHEMA == "daily":
+            return jsonify({"attendance": daily_attendance_records()})
+        # Collection name 'attendance1' is already correctly used here
+        records = list(mongo.db.attendance1.find({}, {"_id": 0}))
+        return jsonify({"attendance": records})
+
+    try:
+        date_from = parse_date_arg("from")
+        date_to = parse_date_arg("to")
+        limit = int(request.args.get("limit", ATTENDANCE_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "Invalid limit or date (expected YYYY-MM-DD)"}), 400
+    limit = max(1, min(limit, ATTENDANCE_MAX_PAGE_SIZE))
+    rollnumber = request.args.get("rollnumber", "").strip().upper() or None
+    after = request.args.get("after") or None
+    output_format = request.args.get("format", "json").strip().lower()
+
+    if output_format in ("ndjson", "csv"):
+        # One row per present mark, produced as the Mongo cursor advances
+        rows = attendance_rows(date_from, date_to, rollnumber)
+        if output_format == "csv":
+            return Response(
+                stream_with_context(csv_lines(rows)),
+                mimetype="text/csv",
+                headers={"Content-Disposition": "attachment; filename=attendance.csv"},
+            )
+        return Response(
+            stream_with_context(
+                json.dumps({"rollnumber": roll, "date": day}) + "\n" for roll, day in rows
+            ),
+            mimetype="application/x-ndjson",
+        )
+    if output_format != "json":
+        return jsonify({"error": "Invalid format (expected json, ndjson or csv)"}), 400
+
+    records, next_cursor = attendance_page(after, limit, date_from, date_to, rollnumber)
+    return jsonify({"attendance": records, "next": next_cursor})
+
+def csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["rollnumber", "date"])
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+def attendance_page(after, limit, date_from, date_to, rollnumber):
+    # One page of per-student records ordered by roll number; the roll number
+    # of the last record is the cursor for the next page
+    if ATTENDANCE_SCHEMA == "daily":
+        query = {}
+        condition = roll_query(rollnumber, after)
+        if condition:
+            query["RollNumber"] = condition
+        users = list(
+            mongo.db.data.find(query, {"_id": 0, "id": 1, "RollNumber": 1})
+            .sort("RollNumber", 1)
+            .limit(limit + 1)
+        )
+        next_cursor = users[limit - 1]["RollNumber"] if len(users) > limit else None
+        records = {
+            user.get("id"): {"username": user.get("RollNumber"), "id": user.get("id")}
+            for user in users[:limit]
+        }
+        day_query = {"present": {"$in": list(records)}}
+        day_query.update(date_range_query(date_from, date_to))
+        days = mongo.db.attendance_days.find(
+            day_query, {"_id": 0, "date": 1, "present": 1}
+        ).sort("date", 1)
+        for day in days:
+            for user_id in day.get("present", []):
+                if user_id in records:
+                    records[user_id][day["date"]] = True
+        return list(records.values()), next_cursor
+
+    query = {}
+    condition = roll_query(rollnumber, after)
+    if condition:
+        query["username"] = condition
     # Collection name 'attendance1' is already correctly used here
-    records = list(mongo.db.attendance1.find({}, {"_id": 0}))
-    return jsonify({"attendance": records})
+    cursor = mongo.db.attendance1.find(query, {"_id": 0}).sort("username", 1).limit(limit + 1)
+    records = [
+        {
+            key: value
+            for key, value in record.items()
+            if not DATE_KEY_PATTERN.match(key) or date_in_range(key, date_from, date_to)
+        }
+        for record in cursor
+    ]
+    next_cursor = records[limit - 1].get("username") if len(records) > limit else None
+    return records[:limit], next_cursor
+
+def attendance_rows(date_from, date_to, rollnumber):
+    # Yields (roll number, date) for every present mark matching the filters
+    if ATTENDANCE_SCHEMA == "daily":
+        user_query = {"RollNumber": rollnumber} if rollnumber else {}
+        rolls_by_id = {
+            user.get("id"): user.get("RollNumber")
+            for user in mongo.db.data.find(user_query, {"_id": 0, "id": 1, "RollNumber": 1})
+        }
+        day_query = date_range_query(date_from, date_to)
+        if rollnumber:
+            day_query["present"] = {"$in": list(rolls_by_id)}
+        days = mongo.db.attendance_days.find(
+            day_query, {"_id": 0, "date": 1, "present": 1}, batch_size=ATTENDANCE_PAGE_SIZE
+        ).sort("date", 1)
+        for day in days:
+            for user_id in day.get("present", []):
+                if user_id in rolls_by_id:
+                    yield rolls_by_id[user_id], day["date"]
+        return
+
+    query = {"username": rollnumber} if rollnumber else {}
+    # Collection name 'attendance1' is already correctly used here
+    records = mongo.db.attendance1.find(
+        query, {"_id": 0}, batch_size=ATTENDANCE_PAGE_SIZE
+    ).sort("username", 1)
+    for record in records:
+        for key in sorted(record):
+            if DATE_KEY_PATTERN.match(key) and record[key] and date_in_range(key, date_from, date_to):
+                yield record.get("username"), key
+
+def daily_attendance_records():
+    # Rebuilds the legacy per-student shape from the per-day rosters
+    records = {}
+    for user in mongo.db.data.find({}, {"_id": 0, "id": 1, "RollNumber": 1}):
+        records[user.get("id")] = {"username": user.get("RollNumber"), "id": user.get("id")}
+    for day in mongo.db.attendance_days.find({}, {"_id": 0, "date": 1, "present": 1}):
+        for user_id in day.get("present", []):
+            if user_id in records:
+                records[user_id][day["date"]] = True
+    return list(records.values())
+
+# Models needed by each pipeline, used for preloading and warm-up
+PIPELINE_MODELS = {
+    "facenet": (face_detectors[LOGIN_DETECTOR], face_detectors[REGISTER_DETECTOR], embedder),
+    "cnn": (face_detectors[CNN_LOGIN_DETECTOR], cnn_model),
+    "multiface": (face_detectors[RECOGNIZE_DETECTOR], embedder),
+    "crowd": (model,),
+}
+
+def preload_models():
+    for name in ALL_PIPELINES:
+        if pipeline_enabled(name):
+            for lazy_model in PIPELINE_MODELS[name]:
+                lazy_model.get()
+
+def warm_up_models():
+    # Pays for graph tracing and lazy initialization before real traffic arrives
+    started = time.perf_counter()
+    try:
+        dummy_frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        if pipeline_enabled("facenet"):
+            face_detectors[LOGIN_DETECTOR].get().warm_up()
+        if pipeline_enabled("multiface"):
+            face_detectors[RECOGNIZE_DETECTOR].get().warm_up()
+        if pipeline_enabled("facenet") or pipeline_enabled("multiface"):
+            embed_faces(np.zeros((1, 160, 160, 3), dtype=np.uint8))
+        if pipeline_enabled("cnn"):
+            face_detectors[CNN_LOGIN_DETECTOR].get().warm_up()
+            embed_cnn_faces(np.zeros((1, 160, 160, 1), dtype=np.float32))
+        if pipeline_enabled("crowd"):
+            model.get().predict(source=dummy_frame, conf=0.5, verbose=False)
+        record_startup_timing("warm-up", time.perf_counter() - started)
+    except Exception as e:
+        # Still report ready: the models load on first use as before
+        readiness["warmup_error"] = str(e)
+        print(f"Warning: Model warm-up failed: {e}")
+    readiness["warmup"] = True
+
+def report_startup():
+    print("=" * 50)
+    print("Startup timing report")
+    print(f"Enabled pipelines: {', '.join(sorted(ENABLED_PIPELINES)) or 'none'}")
+    for step, seconds in startup_timings:
+        print(f"  {step:<28} {seconds:6.2f}s")
+    print(f"  {'total':<28} {time.perf_counter() - _startup_started:6.2f}s")
+    print("=" * 50)
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process is up and serving requests
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: gallery loaded and models warmed up
+    ready = readiness["gallery"] and readiness["warmup"]
+    payload = {
+        "ready": ready,
+        "gallery_loaded": readiness["gallery"],
+        "warmed_up": readiness["warmup"],
+        "gallery_size": len(gallery),
+        "pipelines": sorted(ENABLED_PIPELINES),
+    }
+    if readiness["warmup_error"]:
+        payload["warmup_error"] = readiness["warmup_error"]
+    return jsonify(payload), 200 if ready else 503
+
+if PRELOAD_MODELS:
+    preload_models()
+report_startup()
+if WARMUP_ON_STARTUP:
+    threading.Thread(target=warm_up_models, name="model-warmup", daemon=True).start()
+else:
+    readiness["warmup"] = True
 
 if __name__ == '__main__':
     print("=" * 50)
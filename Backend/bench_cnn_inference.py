@@ -0,0 +1,55 @@
+"""
+Micro-benchmark for CNN embedding latency at batch size 1.
+Compares the three ways of running the model used by /CNN-login:
+1. cnn_model.predict()            (the original code path)
+2. cnn_model(faces) direct call   (eager __call__)
+3. compile_cnn_inference(model)   (tf.function with a fixed input signature)
+
+Usage: python bench_cnn_inference.py [iterations]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from cnn_embedding import CNN_INPUT_SHAPE, compile_cnn_inference, create_cnn_embedding_model
+
+WARMUP_CALLS = 10
+
+def measure(name, run, faces, iterations):
+    for _ in range(WARMUP_CALLS):
+        run(faces)
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run(faces)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings = np.array(timings)
+    print(
+        f"{name:<24} mean {timings.mean():7.2f} ms   p50 {np.percentile(timings, 50):7.2f} ms"
+        f"   p95 {np.percentile(timings, 95):7.2f} ms"
+    )
+    return timings.mean()
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    model = create_cnn_embedding_model()
+    model.compile(optimizer='adam', loss='mse')
+    faces = np.random.default_rng(0).random((1,) + CNN_INPUT_SHAPE, dtype=np.float32)
+
+    print(f"CNN embedding latency, batch size 1, {iterations} calls")
+    print("=" * 50)
+    baseline = measure("predict()", lambda x: model.predict(x, verbose=0), faces, iterations)
+    measure("direct __call__", lambda x: model(x, training=False).numpy(), faces, iterations)
+    compiled = compile_cnn_inference(model)
+    fast = measure("compiled tf.function", compiled, faces, iterations)
+    print("=" * 50)
+    print(f"Speed-up over predict(): {baseline / fast:.1f}x")
+
+    # The compiled path must produce the same embeddings
+    difference = np.abs(compiled(faces) - model.predict(faces, verbose=0)).max()
+    print(f"Max absolute difference vs predict(): {difference:.2e}")
+
+if __name__ == "__main__":
+    main()
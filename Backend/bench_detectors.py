@@ -0,0 +1,118 @@
+"""
+Benchmark the face detector backends (haar, dnn, mtcnn) on a folder of images.
+Reports throughput for each backend and, when ground-truth boxes are
+given, recall against them, so each endpoint can pick its speed tier.
+
+counts.json maps image file names to the [x, y, w, h] boxes of the faces
+they contain:
+    {"class_photo.jpg": [[120, 80, 64, 64], [310, 95, 60, 62]], "selfie.png": [[200, 150, 420, 420]]}
+
+A detected box counts as a hit when its IoU with a still unmatched
+ground-truth box reaches MATCH_IOU, so false positives do not raise recall.
+
+Usage: python bench_detectors.py <image dir> [counts.json] [backend ...]
+"""
+
+import json
+import os
+import sys
+import time
+
+import cv2
+
+from face_detectors import DETECTOR_BACKENDS, create_detector
+from face_tracker import box_iou
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+# Overlap a detection needs with a ground-truth box to count as found
+MATCH_IOU = 0.5
+
+def load_images(image_dir):
+    images = []
+    for file_name in sorted(os.listdir(image_dir)):
+        if not file_name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        image = cv2.imread(os.path.join(image_dir, file_name), cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"Skipping unreadable image {file_name}")
+            continue
+        images.append((file_name, image))
+    return images
+
+def count_matches(detected, expected):
+    # Greedy one-to-one matching, best overlaps first
+    pairs = sorted(
+        (
+            (box_iou(found, truth), i, j)
+            for i, found in enumerate(detected)
+            for j, truth in enumerate(expected)
+        ),
+        reverse=True,
+    )
+    used_detected, used_expected = set(), set()
+    for iou, i, j in pairs:
+        if iou < MATCH_IOU:
+            break
+        if i not in used_detected and j not in used_expected:
+            used_detected.add(i)
+            used_expected.add(j)
+    return len(used_expected)
+
+def benchmark(name, images, expected_boxes):
+    try:
+        detector = create_detector(name)
+    except Exception as e:
+        print(f"{name:<8} unavailable: {e}")
+        return
+    # Pays for lazy initialization (graph building, allocations) up front
+    detector.warm_up()
+
+    total_faces = 0
+    found = expected = 0
+    started = time.perf_counter()
+    detections = []
+    for file_name, image in images:
+        detections.append((file_name, [face["box"] for face in detector.detect(image)]))
+    elapsed = time.perf_counter() - started
+
+    for file_name, boxes in detections:
+        total_faces += len(boxes)
+        if file_name in expected_boxes:
+            found += count_matches(boxes, expected_boxes[file_name])
+            expected += len(expected_boxes[file_name])
+
+    recall = f"{found / expected:6.1%}" if expected else "   n/a"
+    print(
+        f"{name:<8} {total_faces / elapsed:8.1f} faces/s  {elapsed / len(images) * 1000:8.1f} ms/img"
+        f"  {total_faces:6d} faces  recall {recall}"
+    )
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    image_dir = sys.argv[1]
+    expected_boxes = {}
+    backends = list(DETECTOR_BACKENDS)
+    extra = sys.argv[2:]
+    if extra and extra[0].endswith(".json"):
+        with open(extra[0]) as f:
+            expected_boxes = json.load(f)
+        extra = extra[1:]
+    if extra:
+        backends = extra
+
+    images = load_images(image_dir)
+    if not images:
+        print(f"No images found in {image_dir}")
+        sys.exit(1)
+
+    print(f"Face detector benchmark, {len(images)} images")
+    print("=" * 70)
+    for name in backends:
+        benchmark(name, images, expected_boxes)
+    print("=" * 70)
+    print(f"Recall: ground-truth faces matched by a detection with IoU >= {MATCH_IOU}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Custom CNN embedding model used by /CNN-login and /register.
+
+TensorFlow is imported inside the functions so deployments that do not
+serve the CNN pipeline never load it.
+"""
+
+CNN_INPUT_SHAPE = (160, 160, 1)
+
+
+def create_cnn_embedding_model():
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense
+    model = Sequential([
+        Conv2D(32, (3, 3), activation='relu', input_shape=CNN_INPUT_SHAPE),
+        MaxPooling2D(2, 2),
+        Conv2D(64, (3, 3), activation='relu'),
+        MaxPooling2D(2, 2),
+        Flatten(),
+        Dense(512, activation='relu'),
+        Dense(512, activation='linear')  # Final dense layer to produce a 512-dimensional embedding
+    ])
+    return model
+
+
+def compile_cnn_inference(model):
+    # Keras predict() rebuilds a data adapter and callbacks on every call, which
+    # dominates latency for a single face. A tf.function with a fixed input
+    # signature is traced once and reused for every batch size.
+    import tensorflow as tf
+
+    @tf.function(
+        input_signature=[tf.TensorSpec(shape=(None,) + CNN_INPUT_SHAPE, dtype=tf.float32)]
+    )
+    def infer(faces):
+        return model(faces, training=False)
+
+    def run(faces):
+        # (N,160,160,1) float32 faces in [0, 1] -> (N,512) NumPy embeddings
+        return infer(tf.convert_to_tensor(faces, dtype=tf.float32)).numpy()
+
+    return run
@@ -0,0 +1,77 @@
+"""
+MongoDB indexes required by the backend's hot queries.
+
+app.py calls ensure_indexes() at startup; index_report.py uses the same
+declarations to report missing or unused indexes and slow query plans.
+"""
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+# collection -> [(keys, options)]
+INDEXES = {
+    "data": [
+        # login, /CNN-login, role changes, deletes, /user_attendance
+        ([("RollNumber", ASCENDING)], {"unique": True}),
+        # /register duplicate check and /users/<username>/images
+        ([("username", ASCENDING)], {}),
+        # seeding the user id counter and id lookups for the daily attendance layout
+        ([("id", DESCENDING)], {}),
+        # count_admins() for the last-admin guard
+        ([("role", ASCENDING)], {}),
+    ],
+    "attendance1": [
+        ([("username", ASCENDING)], {}),
+    ],
+    "attendance_days": [
+        ([("date", ASCENDING)], {"unique": True}),
+        ([("present", ASCENDING)], {}),
+    ],
+}
+
+# Queries the backend runs on every request path, used for explain() reports.
+# Values are placeholders; the plan shape does not depend on them.
+HOT_QUERIES = [
+    ("data", "login by roll number", {"RollNumber": "__sample__"}, None),
+    ("data", "user images by username", {"username": "__sample__"}, None),
+    (
+        "data",
+        "register duplicate check",
+        {"$or": [{"username": "__sample__"}, {"RollNumber": "__sample__"}]},
+        None,
+    ),
+    ("data", "highest user id", {}, [("id", DESCENDING)]),
+    ("attendance1", "attendance by roll number", {"username": "__sample__"}, None),
+    ("attendance_days", "roster by date", {"date": "2000-01-01"}, None),
+    ("attendance_days", "days present by user id", {"present": -1}, None),
+]
+
+
+def ensure_indexes(db):
+    # create_index is a no-op for indexes that already exist. One ping first:
+    # with the server unreachable it raises after a single server-selection
+    # timeout instead of one per index.
+    db.client.admin.command("ping")
+    created = []
+    for collection_name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                created.append(db[collection_name].create_index(keys, **options))
+            except ConnectionFailure:
+                raise
+            except PyMongoError as e:
+                print(f"Warning: Could not create index {keys} on {collection_name}: {e}")
+    return created
+
+
+def missing_indexes(db):
+    missing = []
+    for collection_name, indexes in INDEXES.items():
+        existing = [
+            (list(info["key"]), bool(info.get("unique")))
+            for info in db[collection_name].index_information().values()
+        ]
+        for keys, options in indexes:
+            if (list(keys), bool(options.get("unique"))) not in existing:
+                missing.append((collection_name, keys, options))
+    return missing
@@ -0,0 +1,57 @@
+"""
+Compact storage format for face embeddings kept in MongoDB.
+
+Embeddings used to be stored as BSON arrays of 512 doubles, which costs
+roughly 9 KB per vector and decodes into Python floats on every read.
+This module packs them into a BSON Binary instead:
+
+    header (4 bytes): format version, dtype code, dimension (little endian)
+    payload:          the raw float32 or float16 values
+
+Readers accept both layouts, so documents can be migrated gradually with
+migrate_embeddings.py.
+"""
+
+import struct
+
+import numpy as np
+from bson.binary import Binary
+
+# User-defined BSON Binary subtype used to tag packed embeddings
+EMBEDDING_BINARY_SUBTYPE = 0x80
+EMBEDDING_FORMAT_VERSION = 1
+STORAGE_FORMATS = {"array", "float32", "float16"}
+
+_HEADER = struct.Struct("<BBH")  # version, dtype code, dimension
+_DTYPE_CODES = {"float32": 1, "float16": 2}
+_CODE_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2")}
+
+
+def encode_embedding(embedding, storage="array"):
+    # "array" keeps the legacy list-of-doubles layout
+    if storage == "array":
+        return np.asarray(embedding, dtype=float).ravel().tolist()
+    if storage not in _DTYPE_CODES:
+        raise ValueError(f"Unknown embedding storage format: {storage}")
+    code = _DTYPE_CODES[storage]
+    values = np.ascontiguousarray(np.ravel(embedding), dtype=_CODE_DTYPES[code])
+    header = _HEADER.pack(EMBEDDING_FORMAT_VERSION, code, values.shape[0])
+    return Binary(header + values.tobytes(), EMBEDDING_BINARY_SUBTYPE)
+
+
+def decode_embedding(value):
+    # Packed embeddings are returned as a read-only view over the BSON bytes
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        version, code, dimension = _HEADER.unpack_from(value)
+        if version != EMBEDDING_FORMAT_VERSION or code not in _CODE_DTYPES:
+            raise ValueError(
+                f"Unsupported embedding format (version {version}, dtype code {code})"
+            )
+        return np.frombuffer(
+            value, dtype=_CODE_DTYPES[code], count=dimension, offset=_HEADER.size
+        )
+    return np.asarray(value, dtype=np.float32)
+
+
+def is_packed(value):
+    return isinstance(value, (bytes, bytearray, memoryview))
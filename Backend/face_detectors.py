@@ -0,0 +1,153 @@
+"""
+Interchangeable face detector backends.
+
+Every backend returns faces in the MTCNN structure:
+
+    {"box": [x, y, w, h], "confidence": float, "keypoints": {name: (x, y)}}
+
+warm_up() runs every stage of the backend once, so tracing and lazy
+allocations happen before the first request. detect(image, scale) takes the factor the caller shrank the original frame
+by, so size limits such as HAAR_MIN_FACE_SIZE stay in original pixels.
+
+    haar   OpenCV Haar cascade: fastest, least accurate, no keypoints
+    mtcnn  MTCNN: most accurate, slowest on CPU, five facial keypoints
+    dnn    OpenCV DNN SSD detector loaded from a local model file (for example
+           res10_300x300_ssd_iter_140000.caffemodel + deploy.prototxt): close
+           to MTCNN accuracy at a fraction of its CPU cost, no keypoints
+"""
+
+import os
+import threading
+
+import cv2
+import numpy as np
+
+DETECTOR_BACKENDS = ("haar", "mtcnn", "dnn")
+
+HAAR_CASCADE_PATH = os.getenv(
+    "HAAR_CASCADE_PATH", cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+)
+HAAR_MIN_FACE_SIZE = int(os.getenv("HAAR_MIN_FACE_SIZE", "100"))
+DNN_FACE_MODEL = os.getenv("DNN_FACE_MODEL", "res10_300x300_ssd_iter_140000.caffemodel")
+DNN_FACE_CONFIG = os.getenv("DNN_FACE_CONFIG", "deploy.prototxt")
+DNN_CONFIDENCE = float(os.getenv("DNN_CONFIDENCE", "0.6"))
+
+
+class HaarDetector:
+    name = "haar"
+
+    def __init__(self, cascade_path=HAAR_CASCADE_PATH, min_size=HAAR_MIN_FACE_SIZE):
+        self.cascade_path = cascade_path
+        # detectMultiScale keeps per-image state in the classifier, so each
+        # thread (e.g. the parallel registration workers) gets its own cascade
+        self._local = threading.local()
+        if self._cascade().empty():
+            raise ValueError(f"Could not load Haar cascade from {cascade_path}")
+        self.min_size = (min_size, min_size)
+
+    def warm_up(self):
+        self.detect(np.zeros((480, 640, 3), dtype=np.uint8))
+
+    def _cascade(self):
+        cascade = getattr(self._local, "cascade", None)
+        if cascade is None:
+            cascade = self._local.cascade = cv2.CascadeClassifier(self.cascade_path)
+        return cascade
+
+    def detect(self, image, scale=1.0):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        min_size = tuple(max(1, int(round(side * scale))) for side in self.min_size)
+        faces = self._cascade().detectMultiScale(
+            gray, scaleFactor=1.1, minNeighbors=5, minSize=min_size
+        )
+        return [
+            {"box": [int(value) for value in face], "confidence": 1.0, "keypoints": {}}
+            for face in faces
+        ]
+
+
+class MTCNNDetector:
+    name = "mtcnn"
+
+    def __init__(self):
+        from mtcnn.mtcnn import MTCNN
+        self.mtcnn = MTCNN()
+        # Keras predict() is not documented as thread-safe and builds its
+        # predict function lazily, so concurrent requests take turns
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        # A blank frame gives P-Net no candidates, so detect_faces() returns
+        # before R-Net and O-Net run; trace their predict functions directly
+        self.detect(np.zeros((480, 640, 3), dtype=np.uint8))
+        with self._lock:
+            self.mtcnn._rnet.predict(np.zeros((1, 24, 24, 3), dtype=np.float32), verbose=0)
+            self.mtcnn._onet.predict(np.zeros((1, 48, 48, 3), dtype=np.float32), verbose=0)
+
+    def detect(self, image, scale=1.0):
+        with self._lock:
+            faces = self.mtcnn.detect_faces(image)
+        return [
+            {
+                "box": [int(value) for value in face["box"]],
+                "confidence": float(face["confidence"]),
+                "keypoints": face.get("keypoints", {}),
+            }
+            for face in faces
+        ]
+
+
+class DNNDetector:
+    name = "dnn"
+
+    def __init__(self, model_path=DNN_FACE_MODEL, config_path=DNN_FACE_CONFIG,
+                 confidence=DNN_CONFIDENCE, input_size=(300, 300), mean=(104.0, 177.0, 123.0)):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"DNN face model not found: {model_path}")
+        config_path = config_path if config_path and os.path.exists(config_path) else ""
+        self.net = cv2.dnn.readNet(model_path, config_path)
+        self.confidence = confidence
+        self.input_size = input_size
+        self.mean = mean
+        # cv2.dnn.Net keeps its input between setInput() and forward()
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        self.detect(np.zeros((480, 640, 3), dtype=np.uint8))
+
+    def detect(self, image, scale=1.0):
+        height, width = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(
+            cv2.resize(image, self.input_size), 1.0, self.input_size, self.mean
+        )
+        with self._lock:
+            self.net.setInput(blob)
+            detections = self.net.forward()
+
+        faces = []
+        # SSD output: [1, 1, N, 7] rows of (image id, label, confidence, x1, y1, x2, y2)
+        for detection in detections.reshape(-1, 7):
+            confidence = float(detection[2])
+            if confidence < self.confidence:
+                continue
+            x1, y1, x2, y2 = (detection[3:7] * np.array([width, height, width, height])).astype(int)
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(width, x2), min(height, y2)
+            if x2 <= x1 or y2 <= y1:
+                continue
+            faces.append(
+                {"box": [int(x1), int(y1), int(x2 - x1), int(y2 - y1)],
+                 "confidence": confidence, "keypoints": {}}
+            )
+        faces.sort(key=lambda face: face["confidence"], reverse=True)
+        return faces
+
+
+def create_detector(name):
+    if name == "haar":
+        return HaarDetector()
+    if name == "mtcnn":
+        return MTCNNDetector()
+    if name == "dnn":
+        return DNNDetector()
+    raise ValueError(f"Unknown face detector '{name}' (expected one of {', '.join(DETECTOR_BACKENDS)})")
@@ -0,0 +1,115 @@
+"""
+IoU face tracker for the streaming recognition endpoint.
+
+/recognize_stream runs the face detector only every few frames and carries
+faces between detections as tracks, moving each box with the velocity seen
+between its last two detections. A track is embedded when it first appears
+and again once its identity goes stale, so a steady scene costs one
+detection every redetect_interval frames and almost no embeddings.
+"""
+
+
+def box_iou(a, b):
+    # Intersection over union of two [x, y, w, h] boxes
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class Track:
+    def __init__(self, track_id, box, frame_index):
+        self.track_id = track_id
+        self.box = tuple(float(value) for value in box)
+        self.velocity = (0.0, 0.0, 0.0, 0.0)
+        self.detected_box = self.box
+        self.detected_at = frame_index
+        self.missed = 0
+        # {"name", "probability", "role"} from the last embedding, or None
+        self.identity = None
+        self.identified_at = None
+
+    def int_box(self):
+        return tuple(int(round(value)) for value in self.box)
+
+
+class FaceTracker:
+    def __init__(self, redetect_interval=5, iou_threshold=0.3, max_missed=2,
+                 refresh_frames=150, unknown_refresh_frames=15):
+        self.redetect_interval = max(1, redetect_interval)
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        # Frames after which a recognized / unrecognized identity is re-embedded
+        self.refresh_frames = refresh_frames
+        self.unknown_refresh_frames = unknown_refresh_frames
+        self.tracks = []
+        self.frame_index = -1
+        self._next_id = 1
+
+    def advance(self):
+        # Moves to the next frame and returns True if it must run the detector
+        self.frame_index += 1
+        for track in self.tracks:
+            track.box = tuple(value + delta for value, delta in zip(track.box, track.velocity))
+        return not self.tracks or self.frame_index % self.redetect_interval == 0
+
+    def update(self, boxes):
+        # Matches detected boxes to tracks; returns the tracks that need an embedding
+        pairs = sorted(
+            (
+                (box_iou(track.box, box), track_number, box_number)
+                for track_number, track in enumerate(self.tracks)
+                for box_number, box in enumerate(boxes)
+            ),
+            reverse=True,
+        )
+        matched_tracks, matched_boxes = set(), set()
+        for iou, track_number, box_number in pairs:
+            if iou < self.iou_threshold:
+                break
+            if track_number in matched_tracks or box_number in matched_boxes:
+                continue
+            matched_tracks.add(track_number)
+            matched_boxes.add(box_number)
+            self._observe(self.tracks[track_number], boxes[box_number])
+
+        survivors = []
+        for track_number, track in enumerate(self.tracks):
+            if track_number not in matched_tracks:
+                track.missed += 1
+                track.velocity = (0.0, 0.0, 0.0, 0.0)
+                if track.missed > self.max_missed:
+                    continue
+            survivors.append(track)
+        for box_number, box in enumerate(boxes):
+            if box_number not in matched_boxes:
+                survivors.append(Track(self._next_id, box, self.frame_index))
+                self._next_id += 1
+        self.tracks = survivors
+        return [track for track in self.tracks if track.missed == 0 and self.is_stale(track)]
+
+    def identify(self, track, identity):
+        track.identity = identity
+        track.identified_at = self.frame_index
+
+    def is_stale(self, track):
+        if track.identity is None:
+            return True
+        age = self.frame_index - track.identified_at
+        if track.identity.get("role") == "unknown":
+            return age >= self.unknown_refresh_frames
+        return age >= self.refresh_frames
+
+    def _observe(self, track, box):
+        box = tuple(float(value) for value in box)
+        frames = max(1, self.frame_index - track.detected_at)
+        track.velocity = tuple(
+            (new - old) / frames for new, old in zip(box, track.detected_box)
+        )
+        track.box = track.detected_box = box
+        track.detected_at = self.frame_index
+        track.missed = 0
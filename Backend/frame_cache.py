@@ -0,0 +1,93 @@
+"""
+Perceptual-hash cache of recognition results for repeated frames.
+
+Kiosk and live-feed clients resubmit near-identical frames while nobody
+moves. FrameResultCache keys results by a difference hash (dHash) of the
+decoded frame inside a namespace (detector settings and gallery version),
+and returns the stored result for any frame within max_distance bits of a
+cached one that is younger than ttl seconds. Entries are evicted LRU.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def dhash(image, hash_size=16):
+    # hash_size * hash_size bit difference hash of a BGR or gray image, as an int
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class FrameResultCache:
+    def __init__(self, max_entries=256, ttl=5.0, max_distance=8):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        # (namespace, frame hash) -> (stored at, result)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def get(self, namespace, frame_hash):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            key = (namespace, frame_hash)
+            if key not in self._entries:
+                key = self._nearest(namespace, frame_hash)
+                if key is None:
+                    self.misses += 1
+                    return None
+                self.near_hits += 1
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][1]
+
+    def put(self, namespace, frame_hash, result):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[(namespace, frame_hash)] = (time.monotonic(), result)
+            self._entries.move_to_end((namespace, frame_hash))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _nearest(self, namespace, frame_hash):
+        best_key, best_distance = None, self.max_distance + 1
+        for key in self._entries:
+            if key[0] != namespace:
+                continue
+            distance = hamming(key[1], frame_hash)
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+        return best_key
+
+    def _expire(self, now):
+        # Entries are in least recently used order, not insertion order
+        expired = [key for key, (stored_at, _) in self._entries.items() if now - stored_at > self.ttl]
+        for key in expired:
+            del self._entries[key]
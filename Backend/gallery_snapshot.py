@@ -0,0 +1,94 @@
+"""
+On-disk snapshot of the face gallery, shared by all gunicorn workers.
+
+Each worker used to rebuild the gallery from MongoDB at import. A snapshot
+lets workers np.memmap the embedding matrix instead, so the page cache holds
+one copy for every worker and restarts do not re-read the whole collection.
+
+Snapshots are built from MongoDB, never from one worker's in-memory gallery
+(which misses edits made on other workers), and carry the value of a change
+counter that app.py bumps on every register, role change and delete. A
+snapshot whose generation differs from the database's is rejected on read.
+
+File layout (little endian):
+
+    header (64 bytes): magic, format version, dimension, rows,
+                       created timestamp, table offset, table length,
+                       database generation
+    matrix:            rows x dimension float32, already L2-normalized
+    table:             UTF-8 JSON with per-row ids, roll numbers and roles
+
+Snapshots are written to a temporary file and moved into place atomically.
+"""
+
+import json
+import os
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+SNAPSHOT_MAGIC = b"FACEGAL\0"
+SNAPSHOT_FORMAT_VERSION = 2
+
+_HEADER = struct.Struct("<8sIIIdQQQ")
+_HEADER_SIZE = 64
+
+
+def write_snapshot(path, matrix, labels, rollnumbers, roles, generation=0):
+    matrix = np.ascontiguousarray(matrix, dtype="<f4")
+    rows, dimension = matrix.shape
+    table = json.dumps(
+        {"labels": list(labels), "rollnumbers": list(rollnumbers), "roles": list(roles)}
+    ).encode("utf-8")
+    table_offset = _HEADER_SIZE + matrix.nbytes
+    header = _HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, dimension, rows,
+        time.time(), table_offset, len(table), generation,
+    )
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".gallery-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header.ljust(_HEADER_SIZE, b"\0"))
+            f.write(matrix.tobytes())
+            f.write(table)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_snapshot(path, max_age=None, generation=None):
+    # Returns (matrix, labels, rollnumbers, roles) or None if missing, stale,
+    # invalid or written for another database generation.
+    # The matrix is a copy-on-write memmap: pages stay shared until a worker
+    # edits a row in place.
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        header = f.read(_HEADER_SIZE)
+        if len(header) < _HEADER.size:
+            return None
+        (magic, version, dimension, rows, created, table_offset, table_length,
+         snapshot_generation) = _HEADER.unpack_from(header)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT_VERSION:
+            return None
+        if max_age is not None and time.time() - created > max_age:
+            return None
+        if generation is not None and snapshot_generation != generation:
+            return None
+        f.seek(table_offset)
+        table = json.loads(f.read(table_length).decode("utf-8"))
+
+    if rows == 0:
+        matrix = np.zeros((0, dimension), dtype=np.float32)
+    else:
+        matrix = np.memmap(
+            path, dtype="<f4", mode="c", offset=_HEADER_SIZE, shape=(rows, dimension)
+        )
+    return matrix, table["labels"], table["rollnumbers"], table["roles"]
@@ -0,0 +1,80 @@
+"""
+Resolution-aware image decoding for the upload endpoints.
+
+Phones upload 12 MP photos, but the face detectors and YOLO find the same
+faces and people on a frame a thousand pixels across. decode_image() asks
+libjpeg for a 1/2, 1/4 or 1/8 scale decode (it skips the discarded DCT
+coefficients, so this is far cheaper than decoding and then resizing) when
+the caller has no use for full resolution. downscale() shrinks an already
+decoded frame for detection and returns the scale so boxes can be mapped
+back onto the full-resolution image.
+"""
+
+import struct
+
+import cv2
+import numpy as np
+
+# Largest reduction first: (factor, imdecode flags)
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# JPEG start-of-frame markers (SOF0..SOF15 without DHT, JPG and DAC)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def image_dimensions(data):
+    # (width, height) read from a JPEG or PNG header without decoding, or None
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:2] != b"\xff\xd8":
+        return None
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            offset += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Markers without a length field
+            offset += 2
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + struct.unpack(">H", data[offset + 2:offset + 4])[0]
+    return None
+
+
+def downscale(image, max_side):
+    # (image with its long edge at most max_side, scale applied); never upscales
+    height, width = image.shape[:2]
+    if not max_side or max(height, width) <= max_side:
+        return image, 1.0
+    scale = max_side / max(height, width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+def decode_image(data, max_side=0):
+    # BGR image with its long edge at most max_side (0 keeps full resolution), or None
+    flags = cv2.IMREAD_COLOR
+    if max_side:
+        size = image_dimensions(data)
+        if size:
+            for factor, reduced_flags in REDUCED_DECODE_FLAGS:
+                if max(size) / factor >= max_side:
+                    flags = reduced_flags
+                    break
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+    if image is None:
+        return None
+    return downscale(image, max_side)[0]
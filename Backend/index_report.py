@@ -0,0 +1,96 @@
+"""
+Index health report for the backend's MongoDB database.
+This script will:
+1. List declared indexes (db_indexes.py) that are missing
+2. List indexes that have not been used since the server started ($indexStats)
+3. Run explain() on every hot query and flag collection scans and slow plans
+
+Pass --fix to create the missing indexes.
+"""
+
+import os
+import sys
+
+from pymongo import MongoClient
+
+from db_indexes import HOT_QUERIES, ensure_indexes, missing_indexes
+
+# MongoDB connection
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/Face_Recognition")
+SLOW_QUERY_MS = 50
+
+def plan_stages(plan):
+    # Flatten a winning plan tree into its stage names
+    stages = [plan.get("stage")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages.extend(plan_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(plan_stages(child))
+    return [stage for stage in stages if stage]
+
+def report_missing(db):
+    print("\nMissing indexes")
+    print("-" * 50)
+    missing = missing_indexes(db)
+    for collection_name, keys, options in missing:
+        unique = " (unique)" if options.get("unique") else ""
+        print(f"❌ {collection_name}: {keys}{unique}")
+    if not missing:
+        print("✅ All declared indexes exist")
+    return missing
+
+def report_unused(db):
+    print("\nUnused indexes (since server start)")
+    print("-" * 50)
+    unused = 0
+    for collection_name in db.list_collection_names():
+        for stats in db[collection_name].aggregate([{"$indexStats": {}}]):
+            if stats["name"] != "_id_" and stats["accesses"]["ops"] == 0:
+                print(f"⚠️  {collection_name}.{stats['name']}: 0 operations")
+                unused += 1
+    if not unused:
+        print("✅ Every index has been used")
+
+def report_plans(db):
+    print("\nHot query plans")
+    print("-" * 50)
+    for collection_name, label, query, sort in HOT_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort).limit(1)
+        explanation = cursor.explain()
+        stages = plan_stages(explanation["queryPlanner"]["winningPlan"])
+        stats = explanation.get("executionStats", {})
+        millis = stats.get("executionTimeMillis", 0)
+        examined = stats.get("totalDocsExamined", 0)
+        returned = stats.get("nReturned", 0)
+        flag = "✅"
+        if "COLLSCAN" in stages:
+            flag = "❌"
+        elif millis >= SLOW_QUERY_MS:
+            flag = "⚠️ "
+        print(
+            f"{flag} {collection_name} - {label}: {' <- '.join(stages)} "
+            f"({millis} ms, {examined} docs examined, {returned} returned)"
+        )
+
+def main():
+    client = MongoClient(MONGO_URI)
+    db = client.get_default_database()
+
+    print(f"Index report for database '{db.name}'")
+    print("=" * 50)
+
+    missing = report_missing(db)
+    if missing and "--fix" in sys.argv:
+        print("\nCreating missing indexes...")
+        for name in ensure_indexes(db):
+            print(f"   ✅ {name}")
+    report_unused(db)
+    report_plans(db)
+
+    client.close()
+
+if __name__ == "__main__":
+    main()
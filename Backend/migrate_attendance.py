@@ -0,0 +1,74 @@
+"""
+Migration script to convert attendance to per-day rosters.
+This script will:
+1. Read every per-student document in attendance1 ("YYYY-MM-DD": true fields)
+2. Resolve each student's numeric id from the data collection
+3. Upsert one attendance_days document per date holding the present ids
+4. Create the indexes the daily layout is queried by
+
+The legacy attendance1 collection is left untouched. Set
+ATTENDANCE_SCHEMA=daily for the backend once the migration has run.
+"""
+
+import os
+import re
+
+from pymongo import ASCENDING, MongoClient, UpdateOne
+
+# MongoDB connection
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/Face_Recognition")
+DATE_KEY = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+def main():
+    client = MongoClient(MONGO_URI)
+    db = client.get_default_database()
+
+    print("Starting attendance migration to per-day rosters...")
+    print("=" * 50)
+
+    ids_by_roll = {
+        user.get("RollNumber"): user.get("id")
+        for user in db.data.find({}, {"_id": 0, "RollNumber": 1, "id": 1})
+    }
+    print(f"Found {len(ids_by_roll)} registered users")
+
+    ids_by_day = {}
+    total_records = 0
+    skipped = 0
+    for record in db.attendance1.find({}, {"_id": 0}):
+        total_records += 1
+        roll_number = record.get("username")
+        user_id = ids_by_roll.get(roll_number, record.get("id"))
+        if user_id is None:
+            print(f"\n⚠️  Attendance for {roll_number}: no matching user id, skipped")
+            skipped += 1
+            continue
+        for key, present in record.items():
+            if DATE_KEY.match(key) and present:
+                ids_by_day.setdefault(key, set()).add(user_id)
+
+    operations = [
+        UpdateOne(
+            {"date": day},
+            {"$addToSet": {"present": {"$each": sorted(ids)}}},
+            upsert=True,
+        )
+        for day, ids in sorted(ids_by_day.items())
+    ]
+    if operations:
+        db.attendance_days.bulk_write(operations, ordered=False)
+
+    db.attendance_days.create_index([("date", ASCENDING)], unique=True)
+    db.attendance_days.create_index([("present", ASCENDING)])
+
+    print("\n" + "=" * 50)
+    print(f"Migration complete!")
+    print(f"Attendance records read: {total_records}")
+    print(f"Skipped (unknown user): {skipped}")
+    print(f"Days written: {len(operations)}")
+    print(f"Present marks: {sum(len(ids) for ids in ids_by_day.values())}")
+
+    client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Migration script to convert stored embeddings to the packed binary format.
+This script will:
+1. Find all users whose embeddings or CNN_embeddings are still BSON arrays
+2. Re-encode them as packed float32 (or float16) BSON Binary
+3. Write the changes back in bulk and report the size reduction
+
+Set EMBEDDING_STORAGE=float32 (or float16) for the backend afterwards so new
+registrations use the same format.
+"""
+
+import os
+import sys
+
+from bson import encode
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import MongoClient, UpdateOne
+
+from embedding_codec import decode_embedding, encode_embedding, is_packed
+
+# MongoDB connection
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/Face_Recognition")
+TARGET_STORAGE = os.getenv("EMBEDDING_STORAGE", "float32")  # "float32" or "float16"
+BATCH_SIZE = 500
+EMBEDDING_FIELDS = ("embeddings", "CNN_embeddings")
+
+def flush(collection, operations):
+    if not operations:
+        return 0
+    result = collection.bulk_write(operations, ordered=False)
+    operations.clear()
+    return result.modified_count
+
+def main():
+    if TARGET_STORAGE not in ("float32", "float16"):
+        print(f"❌ EMBEDDING_STORAGE must be 'float32' or 'float16', got '{TARGET_STORAGE}'")
+        sys.exit(1)
+
+    client = MongoClient(MONGO_URI)
+    db = client.get_default_database()
+    collection = db.data
+    raw_collection = collection.with_options(
+        codec_options=CodecOptions(document_class=RawBSONDocument)
+    )
+
+    print(f"Starting embedding migration to {TARGET_STORAGE}...")
+    print("=" * 50)
+
+    projection = {field: 1 for field in EMBEDDING_FIELDS}
+    total_users = 0
+    bytes_before = 0
+    bytes_after = 0
+    operations = []
+    updated_count = 0
+
+    for user in raw_collection.find({}, projection, batch_size=BATCH_SIZE):
+        total_users += 1
+        bytes_before += len(user.raw)
+
+        changes = {}
+        for field in EMBEDDING_FIELDS:
+            value = user.get(field)
+            if value is None or is_packed(value):
+                continue
+            changes[field] = encode_embedding(decode_embedding(value), TARGET_STORAGE)
+
+        if not changes:
+            bytes_after += len(user.raw)
+            continue
+
+        migrated = {"_id": user["_id"]}
+        migrated.update({field: user.get(field) for field in EMBEDDING_FIELDS})
+        migrated.update(changes)
+        bytes_after += len(encode(migrated))
+
+        operations.append(UpdateOne({"_id": user["_id"]}, {"$set": changes}))
+        if len(operations) >= BATCH_SIZE:
+            updated_count += flush(collection, operations)
+            print(f"   → {updated_count} users converted so far")
+
+    updated_count += flush(collection, operations)
+
+    print("\n" + "=" * 50)
+    print(f"Migration complete!")
+    print(f"Total users: {total_users}")
+    print(f"Updated: {updated_count}")
+    print(f"Already packed: {total_users - updated_count}")
+    if total_users:
+        print(
+            f"Embedding bytes per user: {bytes_before / total_users:.0f} → "
+            f"{bytes_after / total_users:.0f}"
+        )
+
+    client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Versioned registry for the CNN embedding weights.
+
+Weights used to be saved on every registration and re-read right after,
+which raced between concurrent registrations. The registry stores each
+published weights file under its version together with a SHA-256 checksum,
+and a small manifest names the current version. Publishing writes the
+weights and then the manifest with atomic renames, so readers always see a
+complete, verified file.
+
+Usage:
+    python model_registry.py status
+    python model_registry.py publish <weights.h5> [version]
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+DEFAULT_REGISTRY_PATH = os.getenv("CNN_MODEL_REGISTRY", "/tmp/app_data/cnn_models")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    def __init__(self, root=DEFAULT_REGISTRY_PATH, name="cnn"):
+        self.root = root
+        self.name = name
+        self.manifest_path = os.path.join(root, f"{name}.json")
+
+    def current(self):
+        # {"version", "path", "sha256", "published"} of the current weights, or None
+        try:
+            with open(self.manifest_path) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        entry["path"] = os.path.join(self.root, entry["weights"])
+        return entry
+
+    def manifest_mtime(self):
+        try:
+            return os.stat(self.manifest_path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def verify(self, entry):
+        return file_sha256(entry["path"]) == entry["sha256"]
+
+    def publish(self, weights_path, version=None):
+        os.makedirs(self.root, exist_ok=True)
+        sha256 = file_sha256(weights_path)
+        version = version or f"{time.strftime('%Y%m%d%H%M%S')}-{sha256[:8]}"
+        weights_name = f"{self.name}-{version}.weights.h5"
+
+        self._atomic_copy(weights_path, os.path.join(self.root, weights_name))
+        entry = {
+            "version": version,
+            "weights": weights_name,
+            "sha256": sha256,
+            "published": time.time(),
+        }
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{self.name}-", dir=self.root)
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self.manifest_path)
+        return self.current()
+
+    def bootstrap(self, publish_initial, timeout=120.0):
+        # Publishes the first version exactly once across processes: whoever
+        # creates the lock file calls publish_initial(), everyone else waits
+        # for its manifest. A lock older than timeout is left over from a
+        # crashed publisher and is taken over.
+        os.makedirs(self.root, exist_ok=True)
+        lock_path = os.path.join(self.root, f".{self.name}.bootstrap")
+        while True:
+            entry = self.current()
+            if entry is not None:
+                return entry
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.stat(lock_path).st_mtime > timeout:
+                        os.remove(lock_path)
+                except FileNotFoundError:
+                    pass
+                time.sleep(0.2)
+                continue
+            os.close(fd)
+            try:
+                if self.current() is None:
+                    publish_initial()
+            finally:
+                os.remove(lock_path)
+
+    def _atomic_copy(self, source, destination):
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{self.name}-", dir=self.root)
+        os.close(fd)
+        try:
+            shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, destination)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def main():
+    registry = ModelRegistry()
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "publish" and len(sys.argv) > 2:
+        entry = registry.publish(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+        print(f"✅ Published CNN weights version {entry['version']} ({entry['sha256'][:12]})")
+    elif command == "status":
+        entry = registry.current()
+        if entry is None:
+            print(f"No CNN weights published in {registry.root}")
+            return
+        state = "✅ checksum OK" if registry.verify(entry) else "❌ checksum mismatch"
+        print(f"Current CNN weights: version {entry['version']} - {entry['path']} - {state}")
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Motion gate for fixed cameras on the live recognition feed.
+
+A classroom camera sends mostly unchanged frames during a lecture. For each
+client session MotionGate keeps a small blurred grayscale copy of the last
+frame that went through recognition, together with the faces found in it.
+A new frame is compared against that reference:
+
+    below change_ratio      skip detection, reuse the previous faces
+    a few changed regions   detect only inside those regions (padded, in
+                            full-resolution coordinates, widened to cover
+                            previous faces they clip) and keep the previous
+                            faces no new detection replaces
+    large changes           detect on the whole frame
+
+Sessions are evicted LRU and after session_ttl seconds without frames.
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import cv2
+import numpy as np
+
+# skip: reuse faces as they are; rois: regions to detect in, None for the
+# whole frame; faces: [(box, result)] of the reference frame; reference:
+# thumbnail to store once the frame has been processed
+MotionDecision = namedtuple("MotionDecision", ["skip", "rois", "faces", "reference"])
+
+SessionState = namedtuple("SessionState", ["reference", "faces", "version", "processed_at", "seen_at"])
+
+
+def boxes_overlap(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+def merge_boxes(boxes):
+    # Unions overlapping [x, y, w, h] boxes until none overlap
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                if boxes_overlap(boxes[i], boxes[j]):
+                    (ax, ay, aw, ah), (bx, by, bw, bh) = boxes[i], boxes.pop(j)
+                    x, y = min(ax, bx), min(ay, by)
+                    boxes[i] = (x, y, max(ax + aw, bx + bw) - x, max(ay + ah, by + bh) - y)
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+def widen_regions(rois, boxes, shape):
+    # Grows the regions until each fully covers every box it overlaps
+    # (boxes clipped to the frame), so a face only partly inside a changed
+    # region is detected whole
+    height, width = shape
+    clipped = []
+    for x, y, w, h in boxes:
+        x1, y1 = max(0, int(x)), max(0, int(y))
+        x2, y2 = min(width, int(x + w)), min(height, int(y + h))
+        if x2 > x1 and y2 > y1:
+            clipped.append((x1, y1, x2 - x1, y2 - y1))
+    rois = merge_boxes(rois)
+    widened = True
+    while widened:
+        widened = False
+        for i, (rx, ry, rw, rh) in enumerate(rois):
+            for bx, by, bw, bh in clipped:
+                if not boxes_overlap((rx, ry, rw, rh), (bx, by, bw, bh)):
+                    continue
+                x, y = min(rx, bx), min(ry, by)
+                union = (x, y, max(rx + rw, bx + bw) - x, max(ry + rh, by + bh) - y)
+                if union != (rx, ry, rw, rh):
+                    rx, ry, rw, rh = rois[i] = union
+                    widened = True
+        if widened:
+            rois = merge_boxes(rois)
+    return rois
+
+
+class MotionGate:
+    def __init__(self, width=160, pixel_threshold=25, change_ratio=0.01, max_roi_fraction=0.4,
+                 roi_padding=0.5, refresh_seconds=60.0, max_sessions=64, session_ttl=300.0):
+        self.width = width
+        # Per-pixel gray level difference that counts as a change
+        self.pixel_threshold = pixel_threshold
+        # Fraction of changed thumbnail pixels below which a frame is skipped
+        self.change_ratio = change_ratio
+        # Changed regions covering more of the frame than this are not worth cropping
+        self.max_roi_fraction = max_roi_fraction
+        self.roi_padding = roi_padding
+        # A full pass is forced this often even on a still scene
+        self.refresh_seconds = refresh_seconds
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"frames": 0, "skipped": 0, "regions": 0, "full": 0}
+
+    def check(self, session_id, image, version=None):
+        # version (e.g. the gallery version) forces a full pass when it changes
+        reference, scale = self._thumbnail(image)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            state = self._sessions.get(session_id)
+            self.counters["frames"] += 1
+            if state is not None:
+                self._sessions[session_id] = state._replace(seen_at=now)
+                self._sessions.move_to_end(session_id)
+
+        if (
+            state is None
+            or state.version != version
+            or state.reference.shape != reference.shape
+            or now - state.processed_at > self.refresh_seconds
+        ):
+            return self._count("full", MotionDecision(False, None, [], reference))
+
+        mask = (cv2.absdiff(state.reference, reference) > self.pixel_threshold).astype(np.uint8)
+        if mask.mean() < self.change_ratio:
+            return self._count("skipped", MotionDecision(True, None, state.faces, reference))
+
+        rois = widen_regions(
+            self._changed_regions(mask, scale, image.shape[:2]),
+            [box for box, _ in state.faces],
+            image.shape[:2],
+        )
+        frame_area = image.shape[0] * image.shape[1]
+        if sum(w * h for _, _, w, h in rois) > self.max_roi_fraction * frame_area:
+            return self._count("full", MotionDecision(False, None, [], reference))
+        return self._count("regions", MotionDecision(False, rois, state.faces, reference))
+
+    def store(self, session_id, reference, faces, version=None):
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[session_id] = SessionState(reference, faces, version, now, now)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            frames = self.counters["frames"]
+            return dict(
+                self.counters,
+                sessions=len(self._sessions),
+                skip_rate=self.counters["skipped"] / frames if frames else 0.0,
+            )
+
+    def _thumbnail(self, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+        scale = self.width / width
+        small = cv2.resize(gray, (self.width, max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+        # Blur away sensor noise and compression artifacts
+        return cv2.GaussianBlur(small, (5, 5), 0), scale
+
+    def _changed_regions(self, mask, scale, shape):
+        # Padded full-resolution boxes around the changed areas of the thumbnail
+        height, width = shape
+        mask = cv2.dilate(mask * 255, None, iterations=2)
+        contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        rois = []
+        for contour in contours:
+            x, y, w, h = (value / scale for value in cv2.boundingRect(contour))
+            pad = max(w, h) * self.roi_padding
+            x1, y1 = max(0, int(x - pad)), max(0, int(y - pad))
+            x2, y2 = min(width, int(x + w + pad)), min(height, int(y + h + pad))
+            rois.append((x1, y1, x2 - x1, y2 - y1))
+        return merge_boxes(rois)
+
+    def _count(self, counter, decision):
+        with self._lock:
+            self.counters[counter] += 1
+        return decision
+
+    def _expire(self, now):
+        expired = [
+            session_id for session_id, state in self._sessions.items()
+            if now - state.seen_at > self.session_ttl
+        ]
+        for session_id in expired:
+            del self._sessions[session_id]
@@ -0,0 +1,218 @@
+"""
+Search backends used by FaceGallery to find the closest registered face.
+
+All backends work on the gallery's L2-normalized float32 matrix and address
+entries by row number. The gallery keeps its matrix dense, so removing a row
+moves the last row into the freed slot; backends are told about that move.
+
+    exact  brute-force scan, one matrix multiply (default)
+    ivf    inverted-file index in NumPy: spherical k-means centroids, only the
+           IVF_NPROBE closest lists are scanned per query
+    hnsw   HNSW graph from the optional hnswlib package, HNSW_EF_SEARCH sets
+           the recall/latency trade-off
+
+IVF and HNSW trade a little recall for sub-linear search on large galleries.
+"""
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # optional dependency
+    hnswlib = None
+
+
+class ExactIndex:
+    name = "exact"
+
+    def rebuild(self, matrix):
+        pass
+
+    def add(self, row, matrix):
+        pass
+
+    def remove(self, row):
+        pass
+
+    def move(self, src, dst):
+        pass
+
+    def search(self, queries, matrix):
+        similarities = queries @ matrix.T
+        best_rows = np.argmax(similarities, axis=1)
+        return best_rows, similarities[np.arange(len(best_rows)), best_rows]
+
+
+class IVFIndex(ExactIndex):
+    name = "ivf"
+
+    def __init__(self, nlist=0, nprobe=8, min_train_size=2048, iterations=10, seed=0):
+        self.nlist = nlist  # 0 picks sqrt(gallery size)
+        self.nprobe = max(1, nprobe)
+        self.min_train_size = min_train_size
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.lists = []
+        self.assignments = {}  # row -> list number
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def rebuild(self, matrix):
+        self.centroids = None
+        self.lists = []
+        self.assignments = {}
+        if matrix.shape[0] < self.min_train_size:
+            # Small galleries are scanned exactly until they are worth indexing
+            return
+        nlist = self.nlist or int(np.sqrt(matrix.shape[0]))
+        self.centroids = self._train(matrix, max(1, min(nlist, matrix.shape[0])))
+        assigned = np.argmax(matrix @ self.centroids.T, axis=1)
+        self.lists = [set() for _ in range(len(self.centroids))]
+        for row, list_number in enumerate(assigned):
+            self.lists[list_number].add(row)
+            self.assignments[row] = int(list_number)
+
+    def _train(self, matrix, nlist):
+        # Spherical k-means: centroids stay unit length so inner product ranks lists
+        rng = np.random.default_rng(self.seed)
+        centroids = matrix[rng.choice(matrix.shape[0], nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assigned = np.argmax(matrix @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assigned, matrix)
+            counts = np.bincount(assigned, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = matrix[rng.choice(matrix.shape[0], int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+        return centroids
+
+    def add(self, row, matrix):
+        if not self.trained:
+            if matrix.shape[0] >= self.min_train_size:
+                self.rebuild(matrix)
+            return
+        self.remove(row)
+        list_number = int(np.argmax(self.centroids @ matrix[row]))
+        self.lists[list_number].add(row)
+        self.assignments[row] = list_number
+
+    def remove(self, row):
+        list_number = self.assignments.pop(row, None)
+        if list_number is not None:
+            self.lists[list_number].discard(row)
+
+    def move(self, src, dst):
+        list_number = self.assignments.pop(src, None)
+        if list_number is not None:
+            self.lists[list_number].discard(src)
+            self.lists[list_number].add(dst)
+            self.assignments[dst] = list_number
+
+    def search(self, queries, matrix):
+        if not self.trained:
+            return super().search(queries, matrix)
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        best_rows = np.zeros(len(queries), dtype=np.int64)
+        best_scores = np.full(len(queries), -1.0, dtype=np.float32)
+        for i, query in enumerate(queries):
+            candidates = np.fromiter(
+                (row for list_number in probes[i] for row in self.lists[list_number]),
+                dtype=np.int64,
+            )
+            if len(candidates) == 0:
+                continue
+            scores = matrix[candidates] @ query
+            best = int(np.argmax(scores))
+            best_rows[i] = candidates[best]
+            best_scores[i] = scores[best]
+        return best_rows, best_scores
+
+
+class HNSWIndex(ExactIndex):
+    name = "hnsw"
+
+    def __init__(self, m=16, ef_construction=200, ef_search=64):
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.index = None
+        # hnswlib labels are never reused, so rows are mapped to labels
+        self.row_labels = {}
+        self.label_rows = {}
+        self.next_label = 0
+
+    def rebuild(self, matrix):
+        self.index = hnswlib.Index(space="ip", dim=matrix.shape[1])
+        self.index.init_index(
+            max_elements=max(1024, 2 * matrix.shape[0]),
+            ef_construction=self.ef_construction,
+            M=self.m,
+            allow_replace_deleted=True,
+        )
+        self.index.set_ef(self.ef_search)
+        self.row_labels = {}
+        self.label_rows = {}
+        self.next_label = 0
+        if matrix.shape[0]:
+            labels = np.arange(matrix.shape[0])
+            self.index.add_items(matrix, labels)
+            self.row_labels = {row: row for row in range(matrix.shape[0])}
+            self.label_rows = dict(self.row_labels)
+            self.next_label = matrix.shape[0]
+
+    def add(self, row, matrix):
+        self.remove(row)
+        if self.index.get_current_count() >= self.index.get_max_elements():
+            self.index.resize_index(2 * self.index.get_max_elements())
+        label = self.next_label
+        self.next_label += 1
+        self.index.add_items(matrix[row:row + 1], [label], replace_deleted=True)
+        self.row_labels[row] = label
+        self.label_rows[label] = row
+
+    def remove(self, row):
+        label = self.row_labels.pop(row, None)
+        if label is not None:
+            self.index.mark_deleted(label)
+            del self.label_rows[label]
+
+    def move(self, src, dst):
+        label = self.row_labels.pop(src, None)
+        if label is not None:
+            self.row_labels[dst] = label
+            self.label_rows[label] = dst
+
+    def search(self, queries, matrix):
+        labels, distances = self.index.knn_query(queries, k=1)
+        best_rows = np.array([self.label_rows[int(label)] for label in labels[:, 0]])
+        # hnswlib reports inner-product distance as 1 - similarity
+        return best_rows, (1.0 - distances[:, 0]).astype(np.float32)
+
+
+def create_search_index(backend, **options):
+    backend = (backend or "exact").strip().lower()
+    if backend == "hnsw":
+        if hnswlib is not None:
+            return HNSWIndex(
+                m=options.get("hnsw_m", 16),
+                ef_construction=options.get("hnsw_ef_construction", 200),
+                ef_search=options.get("hnsw_ef_search", 64),
+            )
+        print("Warning: hnswlib is not installed - falling back to the IVF index")
+        backend = "ivf"
+    if backend == "ivf":
+        return IVFIndex(
+            nlist=options.get("ivf_nlist", 0),
+            nprobe=options.get("ivf_nprobe", 8),
+            min_train_size=options.get("ivf_min_train_size", 2048),
+        )
+    if backend != "exact":
+        print(f"Warning: Unknown search backend '{backend}' - using exact search")
+    return ExactIndex()
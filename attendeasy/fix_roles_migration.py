@@ -4,6 +4,7 @@ This script will:
 1. Find all users without a role field or with invalid roles
 2. Set them to the default role ('user')
 3. Special handling for the admin rollnumber
+4. Store valid roles in normalized form ('Admin ' -> 'admin')
 """
 
 from pymongo import MongoClient
@@ -48,6 +49,11 @@ def main():
             print(f"\n❌ User {roll_number}: Role is not a string (type: {type(current_role)}): {current_role}")
             needs_update = True
             new_role = "admin" if str(roll_number).upper() == DEFAULT_ADMIN_ROLLNUMBER else DEFAULT_ROLE
+        elif current_role.strip().lower() in ALLOWED_ROLES and current_role != current_role.strip().lower():
+            # The backend counts admins with an indexed query on the exact value
+            print(f"\n⚠️  User {roll_number}: Role '{current_role}' is not normalized")
+            needs_update = True
+            new_role = current_role.strip().lower()
         elif current_role.lower() not in ALLOWED_ROLES:
             print(f"\n⚠️  User {roll_number}: Invalid role '{current_role}'")
             needs_update = True